@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+
+# benchmark for kismet_status_leds.py, replays a synthetic or recorded eventbus stream from a local stand-in for
+# kismet's /eventbus/events.ws (run in its own process) and drives KismetStatusLeds with the recorder gpio backend.
+# reports frames/sec handled, event to led edge latency percentiles, asyncio task count and rss.
+#
+# latency is measured with GPS_LOCATION probe frames toggling between 3d fix and no fix, each should produce an
+# edge on the gps led. the rest of the stream is background load and should not contain GPS_LOCATION frames.
+
+import argparse, asyncio, json, multiprocessing, random, sys, time
+import websockets
+import kismet_status_leds
+
+parser = argparse.ArgumentParser(description='Benchmark kismet_status_leds.py against a replayed eventbus stream')
+parser.add_argument('--rate', action="store", type=float, default=1000, dest="rate", help="background frames per second, 0 for as fast as possible (default 1000)")
+parser.add_argument('--duration', action="store", type=float, default=10, dest="duration", help="seconds to stream (default 10)")
+parser.add_argument('--probe-interval', action="store", type=float, default=.05, dest="probe_interval", help="seconds between gps latency probes (default .05)")
+parser.add_argument('--mix', action="store", default="MESSAGE=90,PACKETCHAIN_STATS=5,DATASOURCE=5", dest="mix", help="synthetic stream topic weights (default MESSAGE=90,PACKETCHAIN_STATS=5,DATASOURCE=5)")
+parser.add_argument('--new-dev-ratio', action="store", type=float, default=.3, dest="new_dev_ratio", help="fraction of MESSAGE frames reporting a new device (default .3)")
+parser.add_argument('--frames', action="store", dest="frames", help="replay recorded frames (one json frame per line, or a --record capture log) instead of synthetic ones")
+parser.add_argument('--set', action="append", default=[], dest="settings", metavar="NAME=VALUE", help="override a kismet_status_leds.py configuration variable, value is json (ie --set gpio_led_dev_rate_mode='\"pwm\"')")
+results = parser.parse_args()
+
+def rrd(serial_time, rate):
+    return { 'kismet.common.rrd.last_time': serial_time,
+             'kismet.common.rrd.serial_time': serial_time,
+             'kismet.common.rrd.minute_vec': [random.randint(0, rate) for i in range(60)],
+             'kismet.common.rrd.hour_vec': [random.randint(0, rate * 60) for i in range(60)],
+             'kismet.common.rrd.day_vec': [random.randint(0, rate * 3600) for i in range(24)],
+             'kismet.common.rrd.blank_val': 0, 'kismet.common.rrd.aggregator': 'default' }
+
+def synthetic_frames(mix, new_dev_ratio):
+    weights = {}
+    for part in mix.split(','):
+        topic, weight = part.split('=')
+        weights[topic] = float(weight)
+    topics = list(weights.keys())
+    serial_time = 1000
+    while True:
+        topic = random.choices(topics, [weights[t] for t in topics])[0]
+        if topic == 'MESSAGE':
+            if random.random() < new_dev_ratio:
+                msg = "Detected new {} {:02X}:BE:EF:00:00:01".format(random.choice(['802.11 Wi-Fi device', '802.11 Wi-Fi access point', 'Bluetooth device', 'BTLE device']), random.randint(0, 255))
+            else:
+                msg = "Saved data to logfile, {} packets".format(random.randint(0, 100000))
+            yield json.dumps({ 'MESSAGE': { 'kismet.messagebus.message_string': msg,
+                                            'kismet.messagebus.message_flags': 2,
+                                            'kismet.messagebus.message_time': serial_time } })
+        elif topic == 'PACKETCHAIN_STATS':
+            serial_time += 1
+            yield json.dumps({ 'PACKETCHAIN_STATS': { 'kismet.packetchain.' + name: rrd(serial_time, 500) for name in
+                ['packets_rrd', 'peak_packets_rrd', 'dupe_packets_rrd', 'queued_packets_rrd', 'dropped_packets_rrd', 'processed_packets_rrd'] } })
+        elif topic == 'DATASOURCE':
+            event = random.choice(['DATASOURCE_ERROR', 'DATASOURCE_OPENED', 'NEW_DATASOURCE'])
+            yield json.dumps({ event: { 'kismet.datasource.uuid': '5FE308BD-0000-0000-0000-00C0CA{:06X}'.format(random.randint(0, 3)),
+                                        'kismet.datasource.name': 'wlan0', 'kismet.datasource.running': 1 } })
+        else:
+            yield json.dumps({ topic: {} })
+
+# json lines or a kismet_status_leds.py --record capture log, looped
+def recorded_frames(path):
+    with open(path, 'rb') as f:
+        capture = f.read(2) == b'\x1f\x8b' or f.read(len(kismet_status_leds.frame_log_magic) - 2) == kismet_status_leds.frame_log_magic[2:]
+    while True:
+        if capture:
+            for stamp, index, frame in kismet_status_leds.read_frames(path):
+                yield frame.decode()
+        else:
+            with open(path) as f:
+                for l in f:
+                    if l.strip():
+                        yield l.strip()
+
+def gps_probe(fix):
+    return json.dumps({ 'GPS_LOCATION': { 'kismet.common.location.fix': fix, 'kismet.common.location.geopoint': [0, 0] } })
+
+# stand-in for kismet, streams frames to the first client then reports probe send times back over the pipe
+def server(conn, settings):
+    async def handler(ws, *args):
+        async def drain():
+            async for msg in ws:
+                pass
+        drain_task = asyncio.ensure_future(drain())
+        # give the client time to subscribe
+        await asyncio.sleep(.2)
+        if settings.frames:
+            frames = recorded_frames(settings.frames)
+        else:
+            frames = synthetic_frames(settings.mix, settings.new_dev_ratio)
+        loop = asyncio.get_event_loop()
+        start = loop.time()
+        end = start + settings.duration
+        next_probe = start
+        probes = []
+        sent = 0
+        while loop.time() < end:
+            now = loop.time()
+            if now >= next_probe:
+                fix = 3 if len(probes) % 2 == 0 else 0
+                probes.append((time.monotonic(), fix))
+                await ws.send(gps_probe(fix))
+                next_probe += settings.probe_interval
+            await ws.send(next(frames))
+            sent += 1
+            if settings.rate > 0:
+                delay = start + sent / settings.rate - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            elif sent % 100 == 0:
+                await asyncio.sleep(0)
+        conn.send({ 'sent': sent + len(probes), 'probes': probes })
+        drain_task.cancel()
+        await ws.close()
+    async def serve():
+        async with websockets.serve(handler, 'localhost', 0) as ws_server:
+            conn.send(list(ws_server.sockets)[0].getsockname()[1])
+            await asyncio.sleep(settings.duration + 10)
+    asyncio.run(serve())
+
+def percentile(values, pct):
+    if not values:
+        return float('nan')
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+def rss_kb():
+    status = {}
+    try:
+        with open('/proc/self/status') as f:
+            for l in f:
+                key, value = l.partition(':')[::2]
+                status[key] = value.strip()
+        return status.get('VmRSS'), status.get('VmHWM')
+    except OSError:
+        import resource
+        return None, "{} kB".format(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+def main():
+    conn, server_conn = multiprocessing.Pipe()
+    server_process = multiprocessing.Process(target=server, args=(server_conn, results), daemon=True)
+    server_process.start()
+    port = conn.recv()
+
+    # --no-gpio uses the recorder backend, keep every transition for the latency match
+    kismet_status_leds.gpio_recorder_size = None
+    # every probe should move the gps led
+    kismet_status_leds.gpio_led_gps_hysteresis = 0
+    for setting in results.settings:
+        name, value = setting.split('=', 1)
+        setattr(kismet_status_leds, name, json.loads(value))
+    sys.argv = [sys.argv[0], '--connect', 'localhost:{}'.format(port), '--apikey', 'bench', '--skip-test', '--no-gpio']
+    ksl = kismet_status_leds.KismetStatusLeds()
+    loop = ksl.ws_loop
+
+    session = ksl.sessions[0]
+    handled = [0, None, None]
+    dispatch = session.dispatch
+    def count_frame(topic, frame, received=None):
+        now = time.monotonic()
+        if handled[1] is None:
+            handled[1] = now
+        handled[2] = now
+        handled[0] += 1
+        dispatch(topic, frame, received)
+    session.dispatch = count_frame
+
+    async def run():
+        tasks = [loop.create_task(ksl.leds.run()), loop.create_task(session.ws_listener())]
+        max_tasks = 0
+        cpu_start = time.process_time()
+        while not conn.poll():
+            max_tasks = max(max_tasks, len(asyncio.all_tasks()))
+            await asyncio.sleep(.1)
+        cpu = time.process_time() - cpu_start
+        for task in tasks:
+            task.cancel()
+        return max_tasks, cpu
+
+    max_tasks, cpu = loop.run_until_complete(run())
+    report = conn.recv()
+    server_process.terminate()
+
+    # gps edges from the recorded transitions
+    gps = ksl.gpio['leds'].index('gps')
+    edges = []
+    for when, values in ksl.gpio['backend'].transitions:
+        if not edges or edges[-1][1] != values[gps]:
+            edges.append((when, values[gps]))
+
+    latencies = []
+    edge_index = 0
+    for sent_at, fix in report['probes']:
+        want = 1 if fix == 3 else 0
+        while edge_index < len(edges) and (edges[edge_index][0] < sent_at or edges[edge_index][1] != want):
+            edge_index += 1
+        if edge_index < len(edges):
+            latencies.append(edges[edge_index][0] - sent_at)
+    latencies.sort()
+
+    elapsed = (handled[2] - handled[1]) if handled[0] > 1 else float('nan')
+    rss, hwm = rss_kb()
+    print("frames sent:        {}".format(report['sent']))
+    print("frames handled:     {} ({:.0f}/s)".format(handled[0], handled[0] / elapsed if elapsed else 0))
+    print("frames dropped:     {}".format(sum(session.dropped.values())))
+    print("cpu time:           {:.2f}s ({:.1f} us/frame)".format(cpu, cpu / max(handled[0], 1) * 1e6))
+    print("gpio writes:        {}".format(len(ksl.gpio['backend'].transitions)))
+    print("latency probes:     {}/{} matched".format(len(latencies), len(report['probes'])))
+    print("latency p50/p90/p99/max: {:.2f}/{:.2f}/{:.2f}/{:.2f} ms".format(*[percentile(latencies, p) * 1000 for p in [50, 90, 99, 100]]))
+    print("max asyncio tasks:  {}".format(max_tasks))
+    print("rss/peak rss:       {}/{}".format(rss, hwm))
+
+if __name__ == "__main__":
+    main()
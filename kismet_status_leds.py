@@ -29,9 +29,32 @@ httpd_config_file = '~/.kismet/kismet_httpd.conf'
 #   set to non-default values and files are setting up the connection consider setting the environmental variable.
 #   alternatively set httpd_local_port here if configuring by file with non-default local port.
 #httpd_local_port = 2501
-# - lastly a test websocket connection is made to check the configuration and will quit on fail. if the
-#   configuration is known good but kismet is not yet running or reachable use argument --skip-test to proceed
-#   to main loop without testing
+# - multi server mode, one process driving leds for several kismet servers. each entry needs connect (host:port)
+#   and apikey or user and password, optionally name, uri_prefix and leds (led role to line offset, ie
+#   {'ws': 5, 'gps': 6, 'devs': 13}, roles left out use the gpio configuration below, so are shared: a shared ws led
+#   is lit while any server is connected and blinks while any has a datasource in error, a shared gps led shows the
+#   best fix). when any servers are set the connection configuration above and connection arguments are not used.
+#kismet_servers = [{ 'name': 'north', 'connect': '192.168.1.10:2501', 'apikey': 'xxxx', 'leds': { 'ws': 5 } }]
+kismet_servers = []
+# - when the connection drops reconnects back off exponentially from ws_reconnect_min up to ws_reconnect_max
+#   seconds, each delay randomized between half and all of it so units don't all reconnect at once. dead links are
+#   detected with websocket pings every ws_ping_interval seconds, closing if no answer within ws_ping_timeout.
+ws_reconnect_min = 1
+ws_reconnect_max = 60
+ws_ping_interval = 5
+ws_ping_timeout = 5
+# - received frames are queued for handling so a busy moment never stalls reading the socket. when handling falls
+#   behind, GPS_LOCATION and PACKETCHAIN_STATS keep only the latest frame (older ones are stale) and other topics
+#   (ie MESSAGE bursts) are dropped and counted once ws_queue_size frames are waiting.
+ws_queue_size = 1000
+# - any of the configuration variables in this section can also be set in a json file passed with --config, ie
+#   { "kismet_servers": [...], "gpio_led_gps_fix": 20, "gpio_led_dev_found": null }
+# - connection settings found in the files above are cached here once a connection works, and reused on later
+#   starts while the files are unchanged (checked by modification time). None disables caching.
+profile_cache_file = '~/.kismet/kismet_status_leds.profile'
+# - lastly a test websocket connection is made, alongside the main loop, to check the configuration and will quit
+#   on fail. if the configuration is known good but kismet is not yet running or reachable use argument
+#   --skip-test to skip testing
 #
 # gpio configuration
 #
@@ -39,40 +62,1699 @@ httpd_config_file = '~/.kismet/kismet_httpd.conf'
 # the chip for other manufacturers, if not published, can be found using gpiodetect and gpioinfo programs available
 # in gpiod package commonly provided in linux distros.
 gpio_chip = "pinctrl-bcm2835" # raspberry pi
+# gpio backend used to drive the lines, can also be set with --gpio-backend:
+#   auto     - first available of gpiod2, gpiod1, sysfs
+#   gpiod1   - gpiod python module with the v1 (chip/get_lines/line_request) api
+#   gpiod2   - gpiod python module with the v2 (request_lines) api, libgpiod 2.x
+#   sysfs    - legacy /sys/class/gpio interface, no python module needed
+#   ledclass - linux led class (/sys/class/leds), for leds bound to a kernel led driver (ie the gpio-led device tree
+#              overlay on raspberry pi). led offsets below are led names instead (ie gpio_led_gps_fix = 'gps')
+#   recorder - silent in memory recorder keeping the last gpio_recorder_size transitions (used by --no-gpio)
+#   print    - print every change, for testing without hardware
+gpio_backend = 'auto'
+gpio_recorder_size = 1024
+# backends able to (ledclass) run blinks in the kernel (timer trigger), so the script only reprograms a blink when
+# the pattern changes instead of waking for every edge
+gpio_blink_offload = True
 # line offset for led that is illuminated when websocket is connected. undefined leds will be ignored (unused)
 gpio_led_ws_connected = 12
-# blink the ws led when a datasource error is caught, keep blinking until ws disconnection or a event (new
-# datasource or datasource open) suggesting the device has restarted. some remote datasource reconnections seem
-# to be missed.
+# blink the ws led while any datasource is in error. datasources are tracked by uuid from datasource events (error,
+# open, new, closed) and checked against kismet's datasource list every ws_datasource_poll seconds (and on connect),
+# which catches remote datasource reconnections missed by the events. None disables the check.
 gpio_led_ws_err_blink = True
 gpio_led_ws_err_blink_duration = .5
+ws_datasource_poll = 60
+# leds for single datasources by name or uuid, ie {'wlan1': 20, 'hci0': 21}. lit while the source runs, blinking
+# while in error, off when closed or unknown.
+gpio_led_datasources = {}
 # line offset for led that is illuminated when gps fix is reported
 gpio_led_gps_fix = 16
-# 1/2 second blink for 2d fixes, event is published every second
+# 1/2 second blink each second for 2d fixes
 gpio_led_gps_2d_fix_duration = .5
-# stay lit for 3d fixes
+# stay lit for 3d fixes (a duration > 0 blinks like 2d fixes)
 gpio_led_gps_3d_fix_duration = -1
+# the gps led only changes once a new fix state has held for gpio_led_gps_hysteresis seconds, so a fix flapping
+# between 2d and 3d (or lost for a moment) doesn't strobe it. 0 changes on every report
+gpio_led_gps_hysteresis = 2
+# kismet reports the gps every second, after gpio_led_gps_stale seconds without a report the led shows a short flash
+# every 2 seconds (no gps data, ie gpsd or the receiver stopped). None disables
+gpio_led_gps_stale = 5
 # line offset for led that is illuminated when new device is found and duration (in seconds) to remain on. a
 # duration <= 0 will stay on (ie. if you are only looking for a rare phy type to investigate) Note: that
 # currently packet blink does not check dev status
 gpio_led_dev_found = 26
 gpio_led_dev_found_duration = .5
+# eventbus topic new devices are found from. 'MESSAGE' scans every kismet message for "Detected new ... device",
+# 'NEW_DEVICE' subscribes to kismet's new device event instead (no message traffic, but each event carries the
+# full device record and needs a kismet version publishing it to the eventbus)
+gpio_led_dev_found_topic = 'MESSAGE'
+# new devices are classified by kismet phy name (ie IEEE802.11, Bluetooth, BTLE, RTL433) and device type (ie Wi-Fi
+# AP, Wi-Fi Client), entries below are a phy or phy/type (ie 'IEEE802.11/Wi-Fi AP'), case is ignored. leds can be
+# set per phy, ie {'BTLE': 20, 'RTL433': 20} for a rare phy led, these flash for gpio_led_dev_found_duration. the dev
+# led can be limited to the phys in include (all if empty) and skip those in exclude. with the 'MESSAGE' topic the
+# message wording is mapped to these names (ie "802.11 Wi-Fi access point" is IEEE802.11/Wi-Fi AP), device types
+# are only known for 802.11 there.
+gpio_led_dev_phy = {}
+gpio_led_dev_phy_include = []
+gpio_led_dev_phy_exclude = []
 # blink dev led if we are receiving packets
 gpio_led_dev_packet = True
 # short blink, event 
 gpio_led_dev_packet_duration = .2
+# instead of fixed blinks the dev led can show capture load. packets/sec (from PACKETCHAIN_STATS) and new
+# devices/min (from messages) are averaged over gpio_led_dev_rate_window seconds and the higher of the two, on a
+# log scale against the full scale settings, sets either:
+#   'blink' - blink frequency, from gpio_led_dev_rate_min_hz up to gpio_led_dev_rate_max_hz
+#   'pwm'   - duty cycle of a slow software pwm with gpio_led_dev_rate_period, steady on at full scale
+#   None    - fixed blinks as set above
+gpio_led_dev_rate_mode = None
+gpio_led_dev_rate_full_packets = 1000
+gpio_led_dev_rate_full_devices = 60
+gpio_led_dev_rate_window = 10
+gpio_led_dev_rate_min_hz = .5
+gpio_led_dev_rate_max_hz = 8
+gpio_led_dev_rate_period = 1
+# line offset for led flashing on kismet alerts (ie deauth floods, spoofed aps), None is unused. the offset of
+# another led (ie gpio_led_ws_connected) shares it: alerts preempt what it shows, which resumes when they end.
+gpio_led_alert = None
+# blink period and how long an alert blinks (extended by further alerts), priority over other patterns on the led
+# (the leds above are priority 0, datasource errors 1)
+gpio_led_alert_blink = .1
+gpio_led_alert_duration = 10
+gpio_led_alert_priority = 2
+# only these alert types (ie ['DEAUTHFLOOD', 'BCASTDISCON']), all if empty
+gpio_led_alert_headers = []
+#
+# led rules
+#
+# leds can also be driven by rules matching eventbus events. each rule is a dict of:
+#   topic    - eventbus topic (ie 'ALERT', 'DATASOURCE_CLOSED'), topics of rules are subscribed
+#   field    - key of the event compared, a list of keys for nested values. unset matches every event of the topic
+#   op       - eq (default), ne, lt, le, gt, ge, in (field in value), contains (value in field), match (value is a
+#              regex searched in the field) or exists
+#   value    - value the field is compared with
+#   led      - led role (ws, gps, devs, phy:<phy> or a kismet_servers led role) or line offset of an extra led
+#   pattern  - 'on' for duration seconds (steady when duration is unset or <= 0, the default pattern), 'off' or
+#              'blink' with period seconds on and off_period seconds off (default period, stops blinking when
+#              period <= 0) for duration seconds (until stopped when unset or <= 0)
+#   priority - layer of the led the pattern is shown on, >= 0 (default 0). the highest active layer shows,
+#              'off' above 0 ends the layer. when several rules of an event match the same led only the highest
+#              priority applies.
+# the datasource error and alert leds above are built in rules of this form, rules set here are added to
+# them. ie light an extra led on line 21 for 5 seconds when a channel is not being hopped:
+#gpio_led_rules = [{ 'topic': 'DATASOURCE_CHANNEL_LOCKED', 'led': 21, 'duration': 5 }]
+gpio_led_rules = []
+#
+# metrics
+#
+# prometheus style text metrics (frames and handling time per topic, led transitions, reconnects, tasks, event to led
+# latency) served over http on host:port (ie 'localhost:9102') or a unix socket path (ie '/run/kismet_status_leds.sock',
+# read with curl --unix-socket). None disables instrumentation, can also be set with --metrics.
+metrics_listen = None
+#
+# status sharing
+#
+# the derived status (connection, gps fix, datasource health, capture rates and every led) is published in a small
+# memory mapped file other local programs (ie a display or telemetry daemon) can read instead of opening their own
+# kismet eventbus connection, layout in StatusPublisher. ie '/dev/shm/kismet_status_leds'. the gps, new device,
+# packet and datasource topics are subscribed for it even when no led uses them. None disables, can also be set
+# with --status.
+status_file = None
 #
 ### END CONFIGURATION
 
+# configuration as set above, a --config file applies over it (again on each reload)
+config_defaults = { name: value for name, value in globals().items() if not name.startswith('_') }
+
 #load modules
-import argparse, json, sys, os, traceback, asyncio, socket
+import argparse, json, sys, os, traceback, asyncio, socket, re, collections, time, math, random, bisect, functools, operator, struct, gzip, stat
+import base64, urllib.parse, signal, mmap
 try:
     import websockets
 except ImportError:
     print("Failed to load websockets python3 module. installation is available from pip")
     sys.exit(1)
+# optional faster json decoder (orjson or ujson from pip), standard library otherwise
+try:
+    import orjson as json_backend
+except ImportError:
+    try:
+        import ujson as json_backend
+    except ImportError:
+        json_backend = json
+
+# single scheduler task driving every led. events only update the per led state (steady value, on-until deadline,
+# blink period) and wake the scheduler, which sleeps until the nearest deadline. values are kept in a shadow
+# register and flushed in one write per tick, only when a led actually changes.
+#
+# each led has a stack of priority layers, the highest active layer sets the led. priority 0 is the base layer,
+# always present. higher layers (ie alerts) preempt it while on, blinking or within their on time, and are dropped
+# once they end so the layer below shows again. priorities are kept sorted, the top is the last entry.
+class LedScheduler(object):
+    def __init__(self, output):
+        # output(values) is only called from the scheduler task, with every led value, when any of them changed
+        self.output = output
+        self.leds = {}
+        self.values = {}
+        # event to edge latency hook for metrics, latency(seconds) is called on a write caused by an event. event_time
+        # is when the event being handled was received, pending when the first change since the last write was.
+        self.latency = None
+        self.event_time = None
+        self.pending = None
+        self.wake = None
+        # timer callbacks can fire a hair early (clock resolution), avoid spinning on a deadline not quite reached
+        self.slack = .001
+        # output takes blinks as (on seconds, off seconds) values and runs them itself, no wakeups per edge
+        self.offload = False
+
+    def add_led(self, led):
+        self.leds[led] = { 'layers': { 0: self.new_layer() }, 'stack': [0] }
+        self.values[led] = None
+
+    def remove_led(self, led):
+        del self.leds[led]
+        del self.values[led]
+
+    # write every led on the next tick, ie to new gpio lines
+    def refresh(self):
+        for led in self.values:
+            self.values[led] = None
+        self.wakeup()
+
+    @staticmethod
+    def new_layer():
+        return { 'steady': 0, 'on_until': 0, 'blink': 0, 'blink_off': 0, 'blink_start': 0, 'blink_until': 0 }
+
+    # layer of a led at priority, added to the stack if missing
+    def layer(self, led, priority):
+        state = self.leds[led]
+        layer = state['layers'].get(priority)
+        if layer is None:
+            layer = state['layers'][priority] = self.new_layer()
+            bisect.insort(state['stack'], priority)
+        return layer
+
+    def drop_layer(self, state, priority):
+        del state['layers'][priority]
+        state['stack'].remove(priority)
+
+    def now(self):
+        return asyncio.get_event_loop().time()
+
+    # led on, on_time > 0 turns it off again after on_time seconds (overlapping calls extend the deadline), steady
+    # on ends a blink
+    def on(self, led, on_time=-1, priority=0):
+        if led not in self.leds:
+            return
+        layer = self.layer(led, priority)
+        if on_time > 0:
+            layer['steady'] = 0
+            layer['on_until'] = max(layer['on_until'], self.now() + on_time)
+        else:
+            layer['steady'] = 1
+            layer['on_until'] = 0
+            layer['blink'] = 0
+        self.notify()
+
+    # led off, ending a blink. above the base layer this ends the layer so the one below shows
+    def off(self, led, priority=0):
+        if led not in self.leds:
+            return
+        state = self.leds[led]
+        if priority == 0:
+            layer = state['layers'][0]
+            layer['steady'] = 0
+            layer['on_until'] = 0
+            layer['blink'] = 0
+        elif priority in state['layers']:
+            self.drop_layer(state, priority)
+        else:
+            return
+        self.notify()
+
+    # every layer off and dropped
+    def clear(self, led):
+        if led not in self.leds:
+            return
+        self.leds[led] = { 'layers': { 0: self.new_layer() }, 'stack': [0] }
+        self.notify()
+
+    # blink on for period then off for off_period (default same as period) until called with period <= 0, steady on
+    # or off or, with blink_time > 0, for blink_time seconds (overlapping calls extend it). overrides timed on of the
+    # layer while active. changing the pattern of a blinking led keeps its cycle start.
+    def blink(self, led, period, off_period=None, priority=0, blink_time=-1):
+        if led not in self.leds:
+            return
+        if off_period is None:
+            off_period = period
+        now = self.now()
+        if period <= 0:
+            layer = self.leds[led]['layers'].get(priority)
+            if layer is None or not self.blinking(layer, now):
+                return
+            layer['blink'] = 0
+        else:
+            layer = self.layer(led, priority)
+            blink_until = max(layer['blink_until'], now + blink_time) if blink_time > 0 else 0
+            if not self.blinking(layer, now):
+                layer['blink_start'] = now
+            elif layer['blink'] == period and layer['blink_off'] == off_period and layer['blink_until'] == blink_until:
+                return
+            layer['blink'] = period
+            layer['blink_off'] = off_period
+            layer['blink_until'] = blink_until
+        self.notify()
+
+    @staticmethod
+    def blinking(layer, now):
+        return layer['blink'] > 0 and (layer['blink_until'] == 0 or layer['blink_until'] > now)
+
+    # value a layer sets at time now and when that next changes (None if not until another event)
+    def layer_value(self, layer, now):
+        if self.blinking(layer, now):
+            until = layer['blink_until'] or None
+            cycle = layer['blink'] + layer['blink_off']
+            cycle_start = layer['blink_start'] + int((now - layer['blink_start']) / cycle) * cycle
+            if layer['blink_off'] <= 0:
+                return 1, until
+            if self.offload:
+                return (layer['blink'], layer['blink_off']), until
+            if now < cycle_start + layer['blink']:
+                return 1, min(cycle_start + layer['blink'], until or math.inf)
+            return 0, min(cycle_start + cycle, until or math.inf)
+        if layer['on_until'] > now:
+            return 1, layer['on_until']
+        return layer['steady'], None
+
+    # value of the top active layer, ended layers above the base are dropped on the way down
+    def led_value(self, state, now):
+        while True:
+            priority = state['stack'][-1]
+            layer = state['layers'][priority]
+            if priority == 0 or layer['steady'] or layer['on_until'] > now or self.blinking(layer, now):
+                return self.layer_value(layer, now)
+            self.drop_layer(state, priority)
+
+    # flush leds if any changed, return nearest deadline
+    def update(self, now):
+        deadline = None
+        changed = False
+        for led, state in self.leds.items():
+            value, led_deadline = self.led_value(state, now)
+            if value != self.values[led]:
+                self.values[led] = value
+                changed = True
+            if led_deadline is not None and (deadline is None or led_deadline < deadline):
+                deadline = led_deadline
+        if changed:
+            # a failed write (ie gpio i/o error) is reported, the next change writes every led again
+            try:
+                self.output(self.values)
+            except Exception as err:
+                traceback.print_tb(err.__traceback__)
+                print(err)
+                print("Error writing leds!")
+            if self.latency is not None and self.pending is not None:
+                self.latency(self.now() - self.pending)
+        self.pending = None
+        return deadline
+
+    def notify(self):
+        if self.latency is not None and self.pending is None:
+            self.pending = self.event_time or self.now()
+        self.wakeup()
+
+    def wakeup(self):
+        if self.wake is not None and not self.wake.done():
+            self.wake.set_result(None)
+
+    async def run(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            # the only led task, nothing may end it
+            try:
+                deadline = self.update(loop.time() + self.slack)
+            except Exception as err:
+                traceback.print_tb(err.__traceback__)
+                print(err)
+                print("Error updating leds!")
+                deadline = None
+            self.wake = loop.create_future()
+            timer = None
+            if deadline is not None:
+                timer = loop.call_at(deadline, self.wakeup)
+            await self.wake
+            if timer is not None:
+                timer.cancel()
+
+# exponentially weighted moving average of a rate, constant time per update. sample() takes a measured rate
+# (ie packets in the last second), event() counts events and gives events per second.
+class RateEstimator(object):
+    def __init__(self, window):
+        self.window = window
+        self.value = 0.
+        self.last = None
+
+    def decay(self, now):
+        if self.last is None:
+            self.last = now
+            return 1.
+        factor = math.exp(-(now - self.last) / self.window)
+        self.last = now
+        return factor
+
+    def sample(self, value, now):
+        first = self.last is None
+        factor = self.decay(now)
+        self.value = value if first else value + (self.value - value) * factor
+        return self.value
+
+    def event(self, now, count=1):
+        self.value = self.value * self.decay(now) + count / self.window
+        return self.value
+
+    # current rate without adding anything
+    def rate(self, now):
+        if self.last is None:
+            return 0.
+        return self.value * math.exp(-(now - self.last) / self.window)
+
+    def reset(self):
+        self.value = 0.
+        self.last = None
+
+# gpio backends, each requests all led lines at once and writes every line value in one call. gpio modules are
+# imported on request so only the backend in use has to be installed.
+class GpioBackend(object):
+    name = None
+    # set_values takes (on seconds, off seconds) for a blinking led
+    blink_offload = False
+
+    # request offsets (line offsets on chip) as outputs, raise on failure
+    def request(self, chip, offsets):
+        self.offsets = offsets
+
+    # values are in the order of the requested offsets
+    def set_values(self, values):
+        pass
+
+    def release(self):
+        pass
+
+class Gpiod1Backend(GpioBackend):
+    name = 'gpiod1'
+
+    def request(self, chip, offsets):
+        import gpiod
+        self.offsets = offsets
+        self.chip = gpiod.chip(chip)
+        self.lines = self.chip.get_lines(offsets)
+        config = gpiod.line_request()
+        config.consumer = "kismet_status_leds.py"
+        config.request_type = gpiod.line_request.DIRECTION_OUTPUT
+        self.lines.request(config)
+
+    def set_values(self, values):
+        self.lines.set_values(values)
+
+    def release(self):
+        self.lines.release()
+
+class Gpiod2Backend(GpioBackend):
+    name = 'gpiod2'
+
+    def request(self, chip, offsets):
+        import gpiod
+        self.gpiod = gpiod
+        self.offsets = offsets
+        self.request_lines = gpiod.request_lines(self.chip_path(chip), consumer="kismet_status_leds.py",
+                                config={ tuple(offsets): gpiod.LineSettings(direction=gpiod.line.Direction.OUTPUT) })
+
+    # v2 wants a device path, accept a chip label (as v1 did), name or path
+    def chip_path(self, chip):
+        if chip.startswith('/dev/'):
+            return chip
+        if os.path.exists('/dev/' + chip):
+            return '/dev/' + chip
+        for dev in sorted(os.listdir('/dev')):
+            if dev.startswith('gpiochip') and self.gpiod.is_gpiochip_device('/dev/' + dev):
+                with self.gpiod.Chip('/dev/' + dev) as gpio_chip:
+                    if gpio_chip.get_info().label == chip:
+                        return '/dev/' + dev
+        raise OSError("gpio chip '{}' not found".format(chip))
+
+    def set_values(self, values):
+        value = self.gpiod.line.Value
+        self.request_lines.set_values({ offset: (value.ACTIVE if v else value.INACTIVE) for offset, v in zip(self.offsets, values) })
+
+    def release(self):
+        self.request_lines.release()
+
+class SysfsBackend(GpioBackend):
+    name = 'sysfs'
+    sysfs_root = '/sys/class/gpio'
+
+    def request(self, chip, offsets):
+        self.offsets = offsets
+        base = self.chip_base(chip)
+        self.fds = []
+        for offset in offsets:
+            gpio = os.path.join(self.sysfs_root, 'gpio{}'.format(base + offset))
+            if not os.path.isdir(gpio):
+                with open(os.path.join(self.sysfs_root, 'export'), 'w') as f:
+                    f.write(str(base + offset))
+            with open(os.path.join(gpio, 'direction'), 'w') as f:
+                f.write('out')
+            self.fds.append(os.open(os.path.join(gpio, 'value'), os.O_WRONLY))
+
+    # sysfs numbers lines globally, find the base of the chip by label
+    def chip_base(self, chip):
+        for entry in sorted(os.listdir(self.sysfs_root)):
+            if entry.startswith('gpiochip'):
+                with open(os.path.join(self.sysfs_root, entry, 'label')) as f:
+                    label = f.read().strip()
+                if label == chip or entry == chip:
+                    with open(os.path.join(self.sysfs_root, entry, 'base')) as f:
+                        return int(f.read())
+        raise OSError("gpio chip '{}' not found in {}".format(chip, self.sysfs_root))
+
+    # no bulk write in sysfs, at least skip lines that didn't change
+    def set_values(self, values):
+        last = getattr(self, 'last', [None] * len(values))
+        for fd, value, old in zip(self.fds, values, last):
+            if value != old:
+                os.pwrite(fd, b'1' if value else b'0', 0)
+        self.last = list(values)
+
+    def release(self):
+        for fd in self.fds:
+            os.close(fd)
+
+# leds are led class names, blinks go to the kernel timer trigger. only changed leds are written.
+class LedClassBackend(GpioBackend):
+    name = 'ledclass'
+    blink_offload = True
+    leds_root = '/sys/class/leds'
+
+    def request(self, chip, offsets):
+        self.offsets = offsets
+        self.paths = []
+        self.max_brightness = []
+        for offset in offsets:
+            path = os.path.join(self.leds_root, str(offset))
+            if not os.path.isdir(path):
+                raise OSError("led '{}' not found in {}".format(offset, self.leds_root))
+            self.paths.append(path)
+            with open(os.path.join(path, 'max_brightness')) as f:
+                self.max_brightness.append(f.read().strip())
+            # drop any default trigger (ie heartbeat), writing brightness 0 does that too
+            self.write(path, 'brightness', '0')
+        self.last = [0] * len(offsets)
+
+    def write(self, path, attr, value):
+        with open(os.path.join(path, attr), 'w') as f:
+            f.write(value)
+
+    def set_values(self, values):
+        for i, value in enumerate(values):
+            if value == self.last[i]:
+                continue
+            path = self.paths[i]
+            if isinstance(value, tuple):
+                # the timer trigger creates delay_on/delay_off, already there when changing a running blink
+                if not isinstance(self.last[i], tuple):
+                    self.write(path, 'trigger', 'timer')
+                self.write(path, 'delay_on', str(max(1, round(value[0] * 1000))))
+                self.write(path, 'delay_off', str(max(1, round(value[1] * 1000))))
+            else:
+                if isinstance(self.last[i], tuple):
+                    self.write(path, 'trigger', 'none')
+                self.write(path, 'brightness', self.max_brightness[i] if value else '0')
+            self.last[i] = value
+
+    def release(self):
+        for path in self.paths:
+            self.write(path, 'brightness', '0')
+
+class RecorderBackend(GpioBackend):
+    name = 'recorder'
+
+    def request(self, chip, offsets):
+        self.offsets = offsets
+        # (monotonic time, values) of the most recent transitions
+        self.transitions = collections.deque(maxlen=gpio_recorder_size)
+
+    def set_values(self, values):
+        self.transitions.append((time.monotonic(), tuple(values)))
+
+class PrintBackend(GpioBackend):
+    name = 'print'
+
+    def set_values(self, values):
+        print("LEDs set {}".format(", ".join("{}={}".format(offset, value) for offset, value in zip(self.offsets, values))))
+
+gpio_backends = { backend.name: backend for backend in [Gpiod1Backend, Gpiod2Backend, SysfsBackend, LedClassBackend, RecorderBackend, PrintBackend] }
+
+# pick the cheapest interface available on this board
+def gpio_backend_auto():
+    try:
+        import gpiod
+    except ImportError:
+        gpiod = None
+    if hasattr(gpiod, 'request_lines'):
+        return Gpiod2Backend
+    if hasattr(gpiod, 'chip'):
+        return Gpiod1Backend
+    if os.path.isdir(SysfsBackend.sysfs_root):
+        return SysfsBackend
+    return None
+
+# eventbus capture log (--record/--replay): a header, then for every frame a record of monotonic receive time,
+# session index and length followed by the frame. gzip compressed when the file name ends in .gz. appended to when
+# it exists, each run starts with an empty record of session index frame_log_run so the time between runs (or a
+# clock starting over after a reboot) isn't replayed.
+frame_log_magic = b'KSLFRAMES1\n'
+frame_log_record = struct.Struct('<dHI')
+frame_log_run = 0xffff
+
+class FrameRecorder(object):
+    # buffered, the app flushes this long (seconds) after the first frame since the last flush
+    flush_interval = 1
+
+    def __init__(self, path):
+        path = os.path.expanduser(path)
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = (gzip.open if path.endswith('.gz') else open)(path, 'ab')
+        if new:
+            self.file.write(frame_log_magic)
+        # the run marker goes with the first frame, waiting for a connection isn't part of the capture
+        self.run_started = False
+
+    def write(self, index, frame):
+        if isinstance(frame, str):
+            frame = frame.encode()
+        now = time.monotonic()
+        if not self.run_started:
+            self.file.write(frame_log_record.pack(now, frame_log_run, 0))
+            self.run_started = True
+        self.file.write(frame_log_record.pack(now, index, len(frame)))
+        self.file.write(frame)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+# stream (time, session index, frame) records from a capture log, a truncated last record (ie power lost while
+# recording, or a compressed log not closed) ends the log. times carry on across runs from the end of the previous
+# run, so they never go backwards or jump over the time between runs.
+def read_frames(path):
+    path = os.path.expanduser(path)
+    with open(path, 'rb') as f:
+        compressed = f.read(2) == b'\x1f\x8b'
+    with (gzip.open if compressed else open)(path, 'rb') as f:
+        if f.read(len(frame_log_magic)) != frame_log_magic:
+            raise ValueError("{} is not a frame log".format(path))
+        offset = 0.
+        last = None
+        while True:
+            try:
+                record = f.read(frame_log_record.size)
+                if len(record) < frame_log_record.size:
+                    return
+                stamp, index, length = frame_log_record.unpack(record)
+                frame = f.read(length)
+                if len(frame) < length:
+                    return
+            except EOFError:
+                return
+            # a new run, or a log from before run markers whose clock went backwards
+            if last is not None and (index == frame_log_run or stamp + offset < last):
+                offset = last - stamp
+            if index == frame_log_run:
+                continue
+            last = stamp + offset
+            yield last, index, frame
+
+# derived status shared through a memory mapped file, rewritten only when it changes (checked after led writes, off
+# the led write path, and every second for the rates). little endian layout:
+#   header  4s magic 'KSLS', H version, H led count, I sequence
+#   status  d unix time of the last change, H sessions, H sessions connected, b gps fix (-1 unknown), B gps state
+#           (0 unknown, 1 none, 2 2d, 3 3d, 4 stale), h gps satellites (-1 unknown), H datasources, H datasources in
+#           error, d packets/sec, d new devices/min, Q frames dropped
+#   leds    a B per led (0 off, 1 on, 2 blinking in the gpio backend), then a 32s name per led (utf-8, nul padded)
+# the sequence is a seqlock, odd while the file is being written or resized: readers copy the file and retry if the
+# sequence was odd or changed during the copy. copy with unbuffered reads (pread) every attempt, not a buffered
+# file, and don't keep the file mapped: it grows or shrinks when the leds change on a reload, and touching a
+# mapping past the new end faults (SIGBUS). read_status() does this. with several sessions the gps is the first one
+# reporting, the rest are totals.
+class StatusPublisher(object):
+    magic = b'KSLS'
+    version = 1
+    header = struct.Struct('<4sHHI')
+    status = struct.Struct('<dHHbBhHHddQ')
+    name_size = 32
+    gps_states = { None: 0, 'none': 1, '2d': 2, '3d': 3, 'stale': 4 }
+
+    def __init__(self, app, path):
+        self.app = app
+        self.path = os.path.expanduser(path)
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        self.map = None
+        self.leds = None
+        self.sequence = 0
+        self.last = None
+        # set by gpio_write, run() publishes soon after
+        self.changed = asyncio.Event()
+
+    @classmethod
+    def size(cls, count):
+        return cls.header.size + cls.status.size + count * (1 + cls.name_size)
+
+    # resize and remap the file for the current leds and write their names, called with the sequence odd so readers
+    # retry until the write is done
+    def layout(self, leds):
+        if self.map is not None:
+            self.header.pack_into(self.map, 0, self.magic, self.version, len(self.leds), self.sequence)
+            self.map.close()
+        os.ftruncate(self.fd, self.size(len(leds)))
+        self.map = mmap.mmap(self.fd, self.size(len(leds)))
+        self.header.pack_into(self.map, 0, self.magic, self.version, len(leds), self.sequence)
+        self.leds = list(leds)
+        offset = self.size(len(leds)) - len(leds) * self.name_size
+        for led in leds:
+            struct.pack_into('{}s'.format(self.name_size), self.map, offset, led.encode()[:self.name_size])
+            offset += self.name_size
+
+    def publish(self):
+        sessions = self.app.sessions
+        leds = self.app.gpio['leds']
+        now = self.app.leds.now()
+        gps = next((session.gps for session in sessions if session.gps.fix is not None), None)
+        status = (len(sessions), sum(1 for session in sessions if session.ws_ready),
+                  -1 if gps is None else max(-1, min(127, int(gps.fix))), self.gps_states.get(gps and gps.state, 0),
+                  -1 if gps is None or not isinstance(gps.satellites, int) else max(-1, min(32767, gps.satellites)),
+                  sum(len(session.sources) for session in sessions), sum(session.sources_failing for session in sessions),
+                  sum(session.packet_rate.rate(now) for session in sessions),
+                  sum(session.device_rate.rate(now) for session in sessions) * 60,
+                  sum(sum(session.dropped.values()) for session in sessions))
+        values = bytes(2 if isinstance(value, tuple) else 1 if value else 0 for value in (self.app.leds.values[led] for led in leds))
+        # rates decay continuously, only a visible change counts
+        key = status[:7] + (round(status[7], 1), round(status[8], 1), status[9], values)
+        if key == self.last and leds == self.leds:
+            return
+        self.last = key
+        self.sequence += 1
+        if leds != self.leds:
+            self.layout(leds)
+        self.header.pack_into(self.map, 0, self.magic, self.version, len(leds), self.sequence)
+        self.status.pack_into(self.map, self.header.size, time.time(), *status)
+        self.map[self.header.size + self.status.size:self.header.size + self.status.size + len(values)] = values
+        self.sequence += 1
+        self.header.pack_into(self.map, 0, self.magic, self.version, len(leds), self.sequence)
+
+    # a failing status file (ie /dev/shm full) stops publishing, not the leds
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.changed.wait(), 1)
+            except asyncio.TimeoutError:
+                pass
+            self.changed.clear()
+            try:
+                self.publish()
+            except (OSError, struct.error, ValueError) as err:
+                print(err)
+                print("kismet_status_leds.py: unable to publish status to {}, status sharing stopped".format(self.path))
+                self.close()
+                self.app.status = None
+                return
+
+    def close(self):
+        try:
+            if self.map is not None:
+                self.map.close()
+            os.close(self.fd)
+        except OSError:
+            pass
+        self.map = None
+
+# read a status file written by StatusPublisher, for other programs. returns a dict, or None if the file isn't a
+# status file (yet) or kept changing
+def read_status(path):
+    publisher = StatusPublisher
+    fd = os.open(os.path.expanduser(path), os.O_RDONLY)
+    try:
+        for attempt in range(100):
+            if attempt:
+                time.sleep(.001)
+            data = os.pread(fd, os.fstat(fd).st_size, 0)
+            if len(data) < publisher.size(0):
+                return None
+            magic, version, count, sequence = publisher.header.unpack_from(data)
+            if magic != publisher.magic or version != publisher.version:
+                return None
+            if sequence % 2 or len(data) < publisher.size(count):
+                continue
+            if publisher.header.unpack(os.pread(fd, publisher.header.size, 0))[3] != sequence:
+                continue
+            fields = publisher.status.unpack_from(data, publisher.header.size)
+            offset = publisher.header.size + publisher.status.size
+            names = [data[offset + count + i * publisher.name_size:offset + count + (i + 1) * publisher.name_size].rstrip(b'\0').decode()
+                     for i in range(count)]
+            status = dict(zip(['updated', 'sessions', 'connected', 'gps_fix', 'gps_state', 'gps_satellites', 'datasources',
+                               'datasources_failing', 'packets_per_sec', 'devices_per_min', 'frames_dropped'], fields))
+            status['gps_state'] = { value: state for state, value in publisher.gps_states.items() }[status['gps_state']]
+            status['leds'] = dict(zip(names, data[offset:offset + count]))
+            return status
+    finally:
+        os.close(fd)
+    return None
+
+# optional instrumentation, the app holds None when disabled so hot paths only pay a None check
+class Metrics(object):
+    # latency histogram buckets, seconds
+    buckets = [.0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5]
+
+    def __init__(self, app):
+        self.app = app
+        self.frames = collections.Counter()
+        self.handler_seconds = collections.Counter()
+        self.decodes = 0
+        self.decode_seconds = 0.
+        self.transitions = collections.Counter()
+        self.last_values = {}
+        self.latency_counts = [0] * (len(self.buckets) + 1)
+        self.latency_sum = 0.
+        app.leds.latency = self.observe_latency
+
+    def handle_frame(self, session, topic, handler, frame, received=None):
+        key = (session.name, topic)
+        self.frames[key] += 1
+        if handler is None:
+            return
+        self.app.leds.event_time = received or self.app.leds.now()
+        start = time.perf_counter()
+        try:
+            handler(frame)
+        finally:
+            self.handler_seconds[key] += time.perf_counter() - start
+            self.app.leds.event_time = None
+
+    def decode(self, frame):
+        start = time.perf_counter()
+        try:
+            return json_backend.loads(frame)
+        finally:
+            self.decodes += 1
+            self.decode_seconds += time.perf_counter() - start
+
+    def led_write(self, values):
+        for led, value in values.items():
+            if self.last_values.get(led) != value:
+                self.transitions[led] += 1
+        self.last_values = dict(values)
+
+    def observe_latency(self, seconds):
+        self.latency_sum += seconds
+        self.latency_counts[bisect.bisect_left(self.buckets, seconds)] += 1
+
+    def render(self):
+        prefix = 'kismet_status_leds_'
+        out = []
+        def metric(name, kind, help_text, samples):
+            out.append("# HELP {}{} {}".format(prefix, name, help_text))
+            out.append("# TYPE {}{} {}".format(prefix, name, kind))
+            for labels, value in samples:
+                label_text = ",".join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in labels)
+                out.append("{}{}{} {}".format(prefix, name, "{" + label_text + "}" if label_text else "", value))
+        metric('frames_total', 'counter', 'eventbus frames received',
+               [((('server', server), ('topic', topic)), count) for (server, topic), count in sorted(self.frames.items())])
+        metric('frames_dropped_total', 'counter', 'eventbus frames dropped or replaced by a later one while handling was behind',
+               [((('server', session.name), ('topic', topic)), count) for session in self.app.sessions for topic, count in sorted(session.dropped.items())])
+        metric('gps_fix', 'gauge', 'last reported gps fix (0 none, 2 2d, 3 3d)',
+               [((('server', session.name),), session.gps.fix) for session in self.app.sessions if session.gps.fix is not None])
+        metric('gps_satellites', 'gauge', 'satellites in the last gps report',
+               [((('server', session.name),), session.gps.satellites) for session in self.app.sessions if session.gps.satellites is not None])
+        metric('datasources', 'gauge', 'tracked datasources by state',
+               [((('server', session.name), ('state', state)), sum(1 for source in session.sources.values() if source[1] == state))
+                for session in self.app.sessions for state in ('ok', 'error', 'closed')])
+        metric('handler_seconds_total', 'counter', 'time spent handling frames, including decoding',
+               [((('server', server), ('topic', topic)), seconds) for (server, topic), seconds in sorted(self.handler_seconds.items())])
+        metric('decodes_total', 'counter', 'json frame decodes', [((), self.decodes)])
+        metric('decode_seconds_total', 'counter', 'time spent decoding json', [((), self.decode_seconds)])
+        metric('led_transitions_total', 'counter', 'led value changes written',
+               [((('led', led),), count) for led, count in sorted(self.transitions.items())])
+        metric('led_value', 'gauge', 'current led value, 1 while blinking in the output', [((('led', led),), 1 if isinstance(value, tuple) else value) for led, value in sorted(self.last_values.items())])
+        metric('connected', 'gauge', 'websocket connected',
+               [((('server', session.name),), int(session.ws_ready)) for session in self.app.sessions])
+        metric('connects_total', 'counter', 'websocket connections made',
+               [((('server', session.name),), session.reconnects['connects']) for session in self.app.sessions])
+        metric('connect_failures_total', 'counter', 'failed websocket connection attempts',
+               [((('server', session.name),), session.reconnects['failures']) for session in self.app.sessions])
+        metric('asyncio_tasks', 'gauge', 'live asyncio tasks', [((), len(asyncio.all_tasks()))])
+        metric('event_latency_seconds', 'histogram', 'frame receipt to gpio write latency', [])
+        cumulative = 0
+        for bucket, count in zip(self.buckets + ['+Inf'], self.latency_counts):
+            cumulative += count
+            out.append('{}event_latency_seconds_bucket{{le="{}"}} {}'.format(prefix, bucket, cumulative))
+        out.append("{}event_latency_seconds_sum {}".format(prefix, self.latency_sum))
+        out.append("{}event_latency_seconds_count {}".format(prefix, cumulative))
+        return "\n".join(out) + "\n"
+
+    # minimal http server, every request gets the metrics
+    async def serve(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line or line in (b'\r\n', b'\n'):
+                    break
+            body = self.render().encode()
+            writer.write(b"HTTP/1.0 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\nContent-Length: " +
+                         str(len(body)).encode() + b"\r\n\r\n" + body)
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, listen):
+        try:
+            if '/' in listen:
+                # a socket left by an earlier run is replaced, anything else at the path is an error
+                if os.path.lexists(listen):
+                    if not stat.S_ISSOCK(os.lstat(listen).st_mode):
+                        raise OSError("{} exists and is not a socket".format(listen))
+                    os.unlink(listen)
+                self.server = await asyncio.start_unix_server(self.serve, listen)
+            else:
+                host, sep, port = listen.rpartition(':')
+                self.server = await asyncio.start_server(self.serve, host or None, int(port))
+        except (OSError, ValueError) as err:
+            print(err)
+            print("kismet_status_leds.py: unable to serve metrics on {}".format(listen))
+            sys.exit(1)
+        print("kismet_status_leds.py: serving metrics on {}".format(listen))
+
+# gps state of a session from GPS_LOCATION reports: last fix, satellites (when reported) and report time. the led
+# shows the fix state ('3d', '2d', 'none', or 'stale' when reports stop) and is only set when that changes, after
+# the new state held for gpio_led_gps_hysteresis seconds. leaving 'stale' or the initial state is immediate.
+class GpsTracker(object):
+    satellites_key = 'kismet.common.location.satellites'
+    # stale flash, on and off seconds
+    stale_blink = (.05, 1.95)
+    # order of states, a gps led shared by several sessions shows the best
+    rank = { None: 0, 'stale': 1, 'none': 2, '2d': 3, '3d': 4 }
+
+    def __init__(self, session):
+        self.session = session
+        self.fix = None
+        self.satellites = None
+        self.updated = None
+        self.state = None
+        self.candidate = None
+        self.candidate_since = None
+        self.stale_timer = None
+
+    def update(self, fix, satellites=None):
+        now = self.session.app.leds.now()
+        if not isinstance(fix, (int, float)):
+            fix = 0
+        self.fix = fix
+        self.satellites = satellites
+        self.updated = now
+        state = '3d' if fix >= 3 else '2d' if fix == 2 else 'none'
+        if state == self.state:
+            self.candidate = None
+        elif self.state in (None, 'stale') or gpio_led_gps_hysteresis <= 0:
+            self.show(state)
+        elif state != self.candidate:
+            self.candidate = state
+            self.candidate_since = now
+        elif now - self.candidate_since >= gpio_led_gps_hysteresis:
+            self.show(state)
+        # one pending staleness check at a time, it reschedules itself from the last report
+        if gpio_led_gps_stale and self.stale_timer is None:
+            self.stale_timer = asyncio.get_event_loop().call_at(now + gpio_led_gps_stale, self.check_stale)
+
+    def check_stale(self):
+        self.stale_timer = None
+        # gpio_led_gps_stale can be unset by a reload
+        if self.updated is None or not gpio_led_gps_stale:
+            return
+        deadline = self.updated + gpio_led_gps_stale
+        if deadline > self.session.app.leds.now():
+            self.stale_timer = asyncio.get_event_loop().call_at(deadline, self.check_stale)
+        elif self.state != 'stale':
+            self.show('stale')
+
+    def show(self, state):
+        self.state = state
+        self.candidate = None
+        self.session.show_gps()
+
+    # settings reloaded, a stale state is dropped with its check so the next report shows right away
+    def reconfigure(self):
+        if gpio_led_gps_stale:
+            return
+        if self.stale_timer is not None:
+            self.stale_timer.cancel()
+            self.stale_timer = None
+        if self.state == 'stale':
+            self.state = None
+
+    # connection lost, forget the state (the caller clears the led)
+    def reset(self):
+        if self.stale_timer is not None:
+            self.stale_timer.cancel()
+        self.__init__(self.session)
+
+# one websocket eventbus connection with its own credentials, led mapping (led role to scheduler led name, roles
+# without a led are ignored), connection state and event handling. all sessions share the app's led scheduler.
+class KismetSession(object):
+    endpoint = '/eventbus/events.ws'
+    sources_endpoint = '/datasource/all_sources.json'
+
+    def __init__(self, app, name, host, port, apikey=None, username=None, password=None, uri_prefix='', leds=None):
+        self.app = app
+        self.name = name
+        self.timeout = 30
+        self.ws_ready = False
+        # reconnect counters: successful connections, failed connection attempts, attempts since the last
+        # connection and the last backoff delay
+        self.reconnects = { 'connects': 0, 'failures': 0, 'attempt': 0, 'delay': 0 }
+        if apikey:
+            self.ws_uri = "ws://{}:{}{}{}?KISMET={}".format(host, port, uri_prefix, self.endpoint, apikey)
+        else:
+            self.ws_uri = "ws://{}:{}@{}:{}{}{}".format(username, password, host, port, uri_prefix, self.endpoint)
+        # rest api for the datasource list, same credentials
+        self.sources_uri = "http://{}:{}{}{}".format(host, port, uri_prefix, self.sources_endpoint)
+        self.http_headers = {}
+        if apikey:
+            self.sources_uri += "?KISMET=" + urllib.parse.quote(apikey)
+        else:
+            self.http_headers['Authorization'] = "Basic " + base64.b64encode("{}:{}".format(username, password).encode()).decode()
+
+        self.gps = GpsTracker(self)
+        # datasource health by uuid: [name, state] with state 'ok', 'error' or 'closed', and how many are in error
+        self.sources = {}
+        self.sources_failing = 0
+        self.poll_sources = asyncio.Event()
+        # last decoded frame, handlers of one frame share a decode
+        self.decoded = (None, None)
+        # live connection, for subscription changes
+        self.ws_con = None
+        self.configure(leds or {})
+
+        # capture load estimates, for the dev led rate modes and the shared status
+        self.packet_rate = RateEstimator(gpio_led_dev_rate_window)
+        self.device_rate = RateEstimator(gpio_led_dev_rate_window)
+        self.dev_rate_level = 0
+        self.dev_rate_timer = None
+
+        # received frames waiting for handling: (topic, frame, receive time) in order, and the latest frame of each
+        # latest wins topic. the handler task waits on frames_ready.
+        self.queue = collections.deque()
+        self.latest = {}
+        self.frames_ready = asyncio.Event()
+        self.dropped = collections.Counter()
+        self.dropped_reported = (0, -math.inf)
+
+    # leds, handlers and subscriptions from the configuration
+    def configure(self, leds):
+        self.leds = leds
+        # per topic frame handlers, frames are routed on their topic key and decoded only as far as a handler needs.
+        # only topics feeding a configured led and enabled feature get a handler, or the shared status, which has
+        # the gps, capture rates and datasources whatever leds are set.
+        status = self.app.status is not None
+        self.handlers = {}
+        if 'gps' in self.leds or status:
+            self.handlers['GPS_LOCATION'] = self.handle_gps
+        if 'devs' in self.leds or any(led.startswith('phy:') for led in self.leds) or status:
+            if gpio_led_dev_found_topic == 'NEW_DEVICE':
+                self.handlers['NEW_DEVICE'] = self.handle_new_device
+            else:
+                self.handlers['MESSAGE'] = self.handle_message
+        if ('devs' in self.leds and gpio_led_dev_packet) or status:
+            self.handlers['PACKETCHAIN_STATS'] = self.handle_packetchain_stats
+        self.source_leds = any(led.startswith('source:') for led in self.leds)
+        self.track_sources = self.source_leds or ('ws' in self.leds and gpio_led_ws_err_blink) or status
+        if self.track_sources:
+            for topic, state in self.source_events.items():
+                self.handlers[topic] = functools.partial(self.handle_datasource, state)
+        # led rules by topic, a topic with a builtin handler runs both
+        self.rules = self.compile_rules(self.default_rules() + gpio_led_rules)
+        for topic in self.rules:
+            handler = functools.partial(self.handle_rules, topic)
+            if topic in self.handlers:
+                handler = self.chain_handlers(self.handlers[topic], handler)
+            self.handlers[topic] = handler
+
+        # phys the dev led shows
+        self.phy_include = set(phy.lower() for phy in gpio_led_dev_phy_include)
+        self.phy_exclude = set(phy.lower() for phy in gpio_led_dev_phy_exclude)
+
+        # event bus subscriptions to send, the topics handled
+        self.subscriptions = list(self.handlers)
+
+    # apply a reloaded configuration on the live connection: subscribe and unsubscribe only the topics that changed,
+    # then show the current state on the (possibly new) leds. clear_leds() first when leds may be shared.
+    def reconfigure(self, leds):
+        subscriptions = set(self.subscriptions)
+        self.configure(leds)
+        # gps reports no longer handled, the tracker would keep a state nothing updates
+        if 'GPS_LOCATION' in self.handlers:
+            self.gps.reconfigure()
+        else:
+            self.gps.reset()
+        self.packet_rate.window = gpio_led_dev_rate_window
+        self.device_rate.window = gpio_led_dev_rate_window
+        if self.ws_con is not None:
+            messages = [{ 'UNSUBSCRIBE': topic } for topic in subscriptions if topic not in self.handlers]
+            messages += [{ 'SUBSCRIBE': topic } for topic in self.subscriptions if topic not in subscriptions]
+            if messages:
+                asyncio.get_event_loop().create_task(self.send_messages(self.ws_con, messages))
+        self.refresh_leds()
+
+    async def send_messages(self, ws_con, messages):
+        try:
+            for message in messages:
+                await ws_con.send(json.dumps(message))
+        except websockets.exceptions.ConnectionClosed:
+            # subscribed from scratch on reconnect
+            pass
+
+    def clear_leds(self):
+        for led in self.leds:
+            self.gpio_clear(led)
+
+    # show the tracked state, ie after the leds changed
+    def refresh_leds(self):
+        if not self.ws_ready:
+            return
+        self.show_ws()
+        for uuid, (name, state) in self.sources.items():
+            self.show_source(uuid, name, state)
+        self.show_gps()
+        self.dev_rate_level = 0
+        if gpio_led_dev_rate_mode:
+            self.update_dev_rate()
+
+    # make ws connection to test configuration
+    async def ws_test(self):
+        self.tested = False
+        ws_con = None
+        try:
+            ws_con = await asyncio.wait_for(websockets.connect(self.ws_uri), self.timeout)
+        except websockets.exceptions.InvalidStatusCode as err:
+            print(err)
+            print("kismet_status_leds.py: websocket connection returned bad status, check credentials!")
+        except ConnectionRefusedError as err:
+            print(err)
+            print("kismet_status_leds.py: websocket connection refused, check config!")
+        except socket.gaierror as err:
+            print(err)
+            print("kismet_status_leds.py: name resolution failed, check config!")
+        except Exception as err:
+            traceback.print_tb(err.__traceback__)
+            print(err)
+        if ws_con is not None:
+            try:
+                await asyncio.wait_for(ws_con.send('{"SUBSCRIBE": "TIMESTAMP"}'), self.timeout)
+                data = await asyncio.wait_for(ws_con.recv(), self.timeout)
+                ts = json.loads(data)
+                ts['TIMESTAMP']['kismet.system.timestamp.usec']
+                await asyncio.wait_for(ws_con.send('{"UNSUBSCRIBE": "TIMESTAMP"}'), self.timeout)
+                self.tested = True
+                await ws_con.close()
+            except Exception as err:
+                traceback.print_tb(err.__traceback__)
+                print(err)
+
+    # topics where only the newest frame matters
+    latest_topics = ('GPS_LOCATION', 'PACKETCHAIN_STATS')
+    # frames handled before giving the reader a turn
+    handle_batch = 50
+
+    async def ws_listener(self):
+        tasks = [asyncio.get_event_loop().create_task(self.frame_handler())]
+        if ws_datasource_poll:
+            tasks.append(asyncio.get_event_loop().create_task(self.datasource_poller()))
+        try:
+            await self.ws_reader()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def ws_reader(self):
+        while True:
+            try:
+                async with websockets.connect(self.ws_uri, ping_interval=ws_ping_interval, ping_timeout=ws_ping_timeout) as ws_con:
+                    try:
+                        for event in self.subscriptions:
+                            await ws_con.send(json.dumps({'SUBSCRIBE': event}))
+                    except Exception as err:
+                        traceback.print_tb(err.__traceback__)
+                        print(err)
+                        print("Error sending subscibe statments!")
+                        raise
+                    self.ws_ready = True
+                    self.ws_con = ws_con
+                    self.show_ws()
+                    self.reconnects['connects'] += 1
+                    if self.reconnects['connects'] == 1:
+                        self.app.connection_validated(self)
+                    if self.reconnects['connects'] > 1:
+                        print("kismet_status_leds.py: reconnected to {} after {} attempts ({} reconnects, {} failed attempts total)".format(
+                            self.name, self.reconnects['attempt'], self.reconnects['connects'] - 1, self.reconnects['failures']))
+                    self.reconnects['attempt'] = 0
+                    self.poll_sources.set()
+                    # keepalive pings close the connection when the peer stops answering, ending recv()
+                    while True:
+                        try:
+                            ev_msg = await ws_con.recv()
+                            self.queue_frame(ev_msg)
+                            if self.app.recorder is not None:
+                                self.app.record_frame(self, ev_msg)
+                        except websockets.exceptions.ConnectionClosed:
+                            break
+                        except Exception as err:
+                            traceback.print_tb(err.__traceback__)
+                            print(err)
+                            print("Error with handling received data!")
+                            continue
+            except Exception as err:
+                self.reconnects['failures'] += 1
+            if self.ws_ready:
+                print("kismet_status_leds.py: websocket connection error ({}), is kismet running?".format(self.name))
+            self.disconnected()
+            await asyncio.sleep(self.reconnect_delay())
+
+    # forget the state of a lost connection, leds shared with a connected session go on showing that session's state
+    def disconnected(self):
+        self.ws_ready = False
+        self.ws_con = None
+        self.queue.clear()
+        self.latest.clear()
+        self.gps.reset()
+        self.reset_sources()
+        for led in ('gps', 'ws', 'alert'):
+            if not self.led_shared(led):
+                self.gpio_clear(led)
+        self.show_ws()
+        self.show_gps()
+        self.reset_dev_rate()
+
+    # exponential backoff with equal jitter, capped. spreads out a fleet reconnecting to a restarted server. the
+    # doubling stops at reconnect_doublings so a long outage can't overflow it
+    reconnect_doublings = 16
+
+    def reconnect_delay(self):
+        delay = min(ws_reconnect_max, ws_reconnect_min * 2 ** min(self.reconnects['attempt'], self.reconnect_doublings))
+        self.reconnects['attempt'] += 1
+        self.reconnects['delay'] = random.uniform(delay / 2, delay)
+        return self.reconnects['delay']
+
+    # led changes by role, mapped to this session's leds on the shared scheduler
+    def gpio_on(self, led, on_time=-1, priority=0):
+        self.app.leds.on(self.leds.get(led), on_time, priority)
+
+    def gpio_off(self, led, priority=0):
+        self.app.leds.off(self.leds.get(led), priority)
+
+    def gpio_blink(self, led, period, off_period=None, priority=0, blink_time=-1):
+        self.app.leds.blink(self.leds.get(led), period, off_period, priority, blink_time)
+
+    def gpio_clear(self, led):
+        self.app.leds.clear(self.leds.get(led))
+
+    # sessions with a led role on the same led as this one (this session included), roles not mapped per server are
+    # shared by all sessions
+    def role_peers(self, led):
+        name = self.leds.get(led)
+        if name is None:
+            return []
+        return [session for session in self.app.sessions if session.leds.get(led) == name]
+
+    # a led role's led is also used by another connected session
+    def led_shared(self, led):
+        name = self.leds.get(led)
+        return name is not None and any(session is not self and session.ws_ready and name in session.leds.values()
+                                        for session in self.app.sessions)
+
+    # the ws led is lit while any session sharing it is connected, blinking while any of them has a datasource in
+    # error
+    def show_ws(self):
+        connected = [session for session in self.role_peers('ws') if session.ws_ready]
+        if connected:
+            self.gpio_on('ws')
+        else:
+            self.gpio_off('ws')
+        if gpio_led_ws_err_blink and any(session.sources_failing for session in connected):
+            self.gpio_blink('ws', gpio_led_ws_err_blink_duration, priority=1)
+        else:
+            self.gpio_off('ws', priority=1)
+
+    # the gps led shows the best fix state of the sessions sharing it
+    def show_gps(self):
+        state = max((session.gps.state for session in self.role_peers('gps')), key=GpsTracker.rank.get, default=None)
+        if state == 'stale':
+            self.gpio_blink('gps', *GpsTracker.stale_blink)
+        elif state in ('none', None):
+            self.gpio_off('gps')
+        else:
+            duration = gpio_led_gps_3d_fix_duration if state == '3d' else gpio_led_gps_2d_fix_duration
+            if duration > 0:
+                self.gpio_blink('gps', duration, max(0, 1 - duration))
+            else:
+                self.gpio_on('gps')
+
+    # topic of a raw eventbus frame ({"TOPIC": {...}}) by scanning for the first key only
+    @staticmethod
+    def frame_topic(frame):
+        start = frame.find('"') + 1
+        return frame[start:frame.find('"', start)]
+
+    # queue a received frame for the handler task, applying the drop policy when it is behind
+    def queue_frame(self, frame):
+        if isinstance(frame, bytes):
+            frame = frame.decode()
+        topic = self.frame_topic(frame)
+        if topic not in self.handlers:
+            self.dispatch(topic, frame)
+            return
+        received = self.app.leds.now() if self.app.metrics is not None else None
+        if topic in self.latest_topics:
+            if topic in self.latest:
+                self.dropped[topic] += 1
+            self.latest[topic] = (frame, received)
+        elif len(self.queue) < ws_queue_size:
+            self.queue.append((topic, frame, received))
+        else:
+            self.dropped[topic] += 1
+            return
+        self.frames_ready.set()
+
+    # handle queued frames, latest wins topics first, yielding to the reader every handle_batch frames
+    async def frame_handler(self):
+        while True:
+            await self.frames_ready.wait()
+            self.frames_ready.clear()
+            count = 0
+            while self.latest or self.queue:
+                if self.latest:
+                    topic, (frame, received) = self.latest.popitem()
+                else:
+                    topic, frame, received = self.queue.popleft()
+                try:
+                    self.dispatch(topic, frame, received)
+                except Exception as err:
+                    traceback.print_tb(err.__traceback__)
+                    print(err)
+                    print("Error with handling received data!")
+                count += 1
+                if count % self.handle_batch == 0:
+                    await asyncio.sleep(0)
+            # report drops, at most once a minute
+            dropped = sum(self.dropped.values())
+            now = self.app.leds.now()
+            if dropped > self.dropped_reported[0] and now - self.dropped_reported[1] > 60:
+                print("kismet_status_leds.py: handling fell behind ({}), {} frames dropped in total".format(self.name, dropped))
+                self.dropped_reported = (dropped, now)
+
+    # route a raw eventbus frame to its handler, right away
+    def handle_frame(self, frame):
+        if isinstance(frame, bytes):
+            frame = frame.decode()
+        self.dispatch(self.frame_topic(frame), frame)
+
+    def dispatch(self, topic, frame, received=None):
+        handler = self.handlers.get(topic)
+        if self.app.metrics is not None:
+            self.app.metrics.handle_frame(self, topic, handler, frame, received)
+        elif handler is not None:
+            handler(frame)
+
+    def decode(self, frame):
+        if self.decoded[0] is frame:
+            return self.decoded[1]
+        if self.app.metrics is not None:
+            msg = self.app.metrics.decode(frame)
+        else:
+            msg = json_backend.loads(frame)
+        self.decoded = (frame, msg)
+        return msg
+
+    @staticmethod
+    def chain_handlers(first, second):
+        def handler(frame):
+            first(frame)
+            second(frame)
+        return handler
+
+    # builtin leds as rules: alerts blink the alert led for a while over anything else
+    def default_rules(self):
+        alert = { 'topic': 'ALERT', 'led': 'alert', 'pattern': 'blink', 'period': gpio_led_alert_blink,
+                  'duration': gpio_led_alert_duration, 'priority': gpio_led_alert_priority }
+        if gpio_led_alert_headers:
+            alert.update({ 'field': 'kismet.alert.header', 'op': 'in', 'value': gpio_led_alert_headers })
+        return [alert]
+
+    rule_ops = { 'eq': operator.eq, 'ne': operator.ne, 'lt': operator.lt, 'le': operator.le, 'gt': operator.gt,
+                 'ge': operator.ge, 'in': lambda field, value: field in value,
+                 'contains': lambda field, value: value in field,
+                 'match': lambda field, value: value.search(str(field)) is not None,
+                 'exists': lambda field, value: True }
+    rule_missing = object()
+
+    # check a rule, returns (topic, priority, led role, field keys, op, value, gpio method name, method arguments),
+    # raises ValueError for a bad one
+    @classmethod
+    def parse_rule(cls, rule):
+        try:
+            led = rule['led']
+            led = 'gpio{}'.format(led) if isinstance(led, int) else led.lower() if led.startswith('phy:') else led
+            field = rule.get('field')
+            keys = [field] if isinstance(field, str) else list(field or [])
+            op = cls.rule_ops[rule.get('op', 'eq')]
+            value = rule.get('value')
+            if rule.get('op') == 'match':
+                value = re.compile(value)
+            pattern = rule.get('pattern', 'on')
+            duration = rule.get('duration', -1)
+            priority = rule.get('priority', 0)
+            if not isinstance(priority, int) or priority < 0:
+                raise ValueError("priority must be an integer >= 0")
+            if pattern == 'on':
+                action = ('gpio_on', (led, duration, priority))
+            elif pattern == 'off':
+                action = ('gpio_off', (led, priority))
+            elif pattern == 'blink':
+                action = ('gpio_blink', (led, rule['period'], rule.get('off_period'), priority, duration))
+            else:
+                raise ValueError("unknown pattern '{}'".format(pattern))
+            return (rule['topic'], priority, led, keys, op, value) + action
+        except (KeyError, TypeError, ValueError, AttributeError, re.error) as err:
+            raise ValueError("bad led rule {}: {}".format(rule, err))
+
+    # compile rules to {topic: [(led role, field keys, op, value, action)]}, highest priority first. rules for leds
+    # this session doesn't have are dropped so their topics aren't subscribed
+    def compile_rules(self, rules):
+        compiled = {}
+        for rule in rules:
+            topic, priority, led, keys, op, value, method, args = self.parse_rule(rule)
+            if led in self.leds:
+                action = functools.partial(getattr(self, method), *args)
+                compiled.setdefault(topic, []).append((priority, led, keys, op, value, action))
+        for topic, entries in compiled.items():
+            entries.sort(key=lambda entry: -entry[0])
+            compiled[topic] = [entry[1:] for entry in entries]
+        return compiled
+
+    # apply the first matching rule of each led
+    def handle_rules(self, topic, frame):
+        event = self.decode(frame).get(topic)
+        applied = set()
+        for led, keys, op, value, action in self.rules[topic]:
+            if led in applied:
+                continue
+            if keys:
+                field = event
+                for key in keys:
+                    try:
+                        field = field[key]
+                    except (KeyError, IndexError, TypeError):
+                        field = self.rule_missing
+                        break
+                if field is self.rule_missing:
+                    continue
+                try:
+                    if not op(field, value):
+                        continue
+                except TypeError:
+                    continue
+            applied.add(led)
+            action()
+
+    def handle_gps(self, frame):
+        gps_msg = self.decode(frame)['GPS_LOCATION']
+        self.gps.update(gps_msg.get('kismet.common.location.fix', 0), gps_msg.get(GpsTracker.satellites_key))
+
+    # new device messages are "Detected new <phy> device|access point|client <mac>", matched in one pass over the
+    # raw frame (phy names and the message prefix never need json escaping) so messages are never decoded
+    new_dev_message = re.compile(r'Detected new (?P<phy>[^"]+?) (?P<type>device|access point|client)\b')
+    # message wording to kismet phy names (prefix of the phy part, lower case), and for 802.11 to device types, so
+    # both topics classify devices by the names kismet.device.base.phyname and kismet.device.base.type use. ie
+    # "Detected new 802.11 Wi-Fi access point" or "Detected new 802.11 ad-hoc device"
+    message_phys = [('802.11', 'IEEE802.11'), ('bluetooth', 'Bluetooth'), ('btle', 'BTLE')]
+    message_dot11_types = { 'access point': 'Wi-Fi AP', 'client': 'Wi-Fi Client', 'device': 'Wi-Fi Device',
+                            'ad-hoc': 'Wi-Fi Ad-Hoc', 'bridged': 'Wi-Fi Bridged' }
+    # (phy part, type part) of messages seen to (phy name, device type)
+    message_kinds = {}
+    new_dev_phy = re.compile(r'"kismet\.device\.base\.phyname"\s*:\s*"(?P<phy>[^"]*)"')
+    new_dev_type = re.compile(r'"kismet\.device\.base\.type"\s*:\s*"(?P<type>[^"]*)"')
+
+    def handle_message(self, frame):
+        match = self.new_dev_message.search(frame)
+        if match is not None:
+            kind = self.message_kinds.get(match.groups())
+            if kind is None:
+                kind = self.message_kinds[match.groups()] = self.message_kind(*match.groups())
+            self.new_device(*kind)
+
+    @classmethod
+    def message_kind(cls, phy, dev_type):
+        words = phy.lower()
+        for prefix, name in cls.message_phys:
+            if words.startswith(prefix):
+                break
+        else:
+            # a phy without a mapping goes by its message wording
+            return phy, None
+        if name != 'IEEE802.11':
+            return name, None
+        for word in words.split()[1:]:
+            if word in cls.message_dot11_types:
+                return name, cls.message_dot11_types[word]
+        return name, cls.message_dot11_types.get(dev_type)
+
+    # every NEW_DEVICE frame is a new device, classify it from the device record without decoding it
+    def handle_new_device(self, frame):
+        phy = self.new_dev_phy.search(frame)
+        dev_type = self.new_dev_type.search(frame)
+        self.new_device(phy and phy.group('phy'), dev_type and dev_type.group('type'))
+
+    def new_device(self, phy=None, dev_type=None):
+        if phy:
+            kinds = [phy.lower()]
+            if dev_type:
+                kinds.append("{}/{}".format(kinds[0], dev_type.lower()))
+            for kind in kinds:
+                self.gpio_on('phy:' + kind, gpio_led_dev_found_duration)
+            if any(kind in self.phy_exclude for kind in kinds):
+                return
+            if self.phy_include and not any(kind in self.phy_include for kind in kinds):
+                return
+        self.device_rate.event(self.app.leds.now())
+        if gpio_led_dev_rate_mode:
+            self.update_dev_rate()
+        else:
+            self.gpio_on('devs', gpio_led_dev_found_duration)
+
+    # datasource events carry the datasource record, pick the uuid and name out of the raw frame
+    source_events = { 'NEW_DATASOURCE': 'ok', 'DATASOURCE_OPENED': 'ok', 'DATASOURCE_ERROR': 'error', 'DATASOURCE_CLOSED': 'closed' }
+    source_uuid = re.compile(r'"kismet\.datasource\.uuid"\s*:\s*"(?P<uuid>[^"]*)"')
+    source_name = re.compile(r'"kismet\.datasource\.name"\s*:\s*"(?P<name>[^"]*)"')
+
+    def handle_datasource(self, state, frame):
+        uuid = self.source_uuid.search(frame)
+        name = self.source_name.search(frame)
+        self.set_source(uuid.group('uuid') if uuid else '', name.group('name') if name else '', state)
+
+    # update one datasource, its led and, when the number of failing sources crosses zero, the ws led
+    def set_source(self, uuid, name, state):
+        source = self.sources.get(uuid)
+        if source is None:
+            source = self.sources[uuid] = [name, None]
+        elif source[0] == name and source[1] == state:
+            return
+        failing = self.sources_failing
+        if source[1] == 'error':
+            failing -= 1
+        if state == 'error':
+            failing += 1
+        source[0] = name
+        source[1] = state
+        if self.source_leds:
+            self.show_source(uuid, name, state)
+        self.set_sources_failing(failing)
+
+    def show_source(self, uuid, name, state):
+        for led in ('source:' + uuid, 'source:' + name):
+            if led in self.leds:
+                if state == 'error':
+                    self.gpio_blink(led, gpio_led_ws_err_blink_duration)
+                elif state == 'ok':
+                    self.gpio_on(led)
+                else:
+                    self.gpio_off(led)
+
+    def set_sources_failing(self, failing):
+        changed = (failing > 0) != (self.sources_failing > 0)
+        self.sources_failing = failing
+        if changed:
+            self.show_ws()
+
+    def reset_sources(self):
+        for uuid, (name, state) in self.sources.items():
+            for led in ('source:' + uuid, 'source:' + name):
+                if not self.led_shared(led):
+                    self.gpio_clear(led)
+        self.sources = {}
+        self.set_sources_failing(0)
+
+    # reconcile the table with kismet's datasource list on connect and every ws_datasource_poll seconds, fetched in
+    # a worker thread
+    async def datasource_poller(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            try:
+                await asyncio.wait_for(self.poll_sources.wait(), ws_datasource_poll)
+            except asyncio.TimeoutError:
+                pass
+            self.poll_sources.clear()
+            if not self.ws_ready or not self.track_sources:
+                continue
+            # the poller is never awaited, an error must not end it
+            try:
+                sources = await loop.run_in_executor(None, self.fetch_sources)
+                if self.ws_ready and isinstance(sources, list):
+                    self.reconcile_sources(sources)
+            except Exception as err:
+                print(err)
+                print("kismet_status_leds.py: unable to read the datasource list ({})".format(self.name))
+
+    # runs in the executor, urllib.request is only imported here so it doesn't add to startup
+    def fetch_sources(self):
+        import urllib.request
+        fields = ['kismet.datasource.uuid', 'kismet.datasource.name', 'kismet.datasource.running', 'kismet.datasource.error']
+        data = urllib.parse.urlencode({ 'json': json.dumps({ 'fields': fields }) }).encode()
+        request = urllib.request.Request(self.sources_uri, data, self.http_headers)
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json_backend.loads(response.read())
+
+    def reconcile_sources(self, sources):
+        seen = set()
+        for source in sources:
+            if not isinstance(source, dict):
+                continue
+            uuid = source.get('kismet.datasource.uuid', '')
+            if source.get('kismet.datasource.error'):
+                state = 'error'
+            elif source.get('kismet.datasource.running'):
+                state = 'ok'
+            else:
+                state = 'closed'
+            self.set_source(uuid, source.get('kismet.datasource.name', ''), state)
+            seen.add(uuid)
+        for uuid in [uuid for uuid in self.sources if uuid not in seen]:
+            self.set_source(uuid, self.sources[uuid][0], 'closed')
+            del self.sources[uuid]
+
+    def handle_packetchain_stats(self, frame):
+        packets = self.packets_last_second(frame)
+        if packets is None:
+            packets = self.parse_packetchain_stat(self.decode(frame)['PACKETCHAIN_STATS'])
+        # a bool from the fallback parser only says there were packets, count that as one
+        self.packet_rate.sample(float(packets), self.app.leds.now())
+        if gpio_led_dev_rate_mode:
+            self.update_dev_rate()
+        elif packets and gpio_led_dev_packet:
+            self.gpio_on('devs', gpio_led_dev_packet_duration)
+
+    # map capture load onto the dev led, the pattern is only changed when the quantized level moves. rates only
+    # change on events, while the led shows load it is checked every dev_rate_check seconds so it winds down once
+    # the events stop (ie no PACKETCHAIN_STATS when gpio_led_dev_packet is off)
+    dev_rate_steps = 16
+    dev_rate_check = 1
+
+    def update_dev_rate(self):
+        now = self.app.leds.now()
+        level = 0.
+        if gpio_led_dev_packet:
+            level = math.log1p(self.packet_rate.rate(now)) / math.log1p(gpio_led_dev_rate_full_packets)
+        level = max(level, math.log1p(self.device_rate.rate(now) * 60) / math.log1p(gpio_led_dev_rate_full_devices))
+        step = int(round(min(level, 1.) * self.dev_rate_steps))
+        if step and self.dev_rate_timer is None and 'devs' in self.leds:
+            self.dev_rate_timer = asyncio.get_event_loop().call_later(self.dev_rate_check, self.check_dev_rate)
+        if step == self.dev_rate_level:
+            return
+        self.dev_rate_level = step
+        if step == 0:
+            self.gpio_blink('devs', 0)
+            self.gpio_off('devs')
+        elif gpio_led_dev_rate_mode == 'pwm':
+            on_time = gpio_led_dev_rate_period * step / self.dev_rate_steps
+            self.gpio_blink('devs', on_time, gpio_led_dev_rate_period - on_time)
+        else:
+            hz = gpio_led_dev_rate_min_hz * (gpio_led_dev_rate_max_hz / gpio_led_dev_rate_min_hz) ** ((step - 1) / (self.dev_rate_steps - 1))
+            self.gpio_blink('devs', .5 / hz)
+
+    def check_dev_rate(self):
+        self.dev_rate_timer = None
+        if gpio_led_dev_rate_mode:
+            self.update_dev_rate()
+
+    def reset_dev_rate(self):
+        if self.dev_rate_timer is not None:
+            self.dev_rate_timer.cancel()
+            self.dev_rate_timer = None
+        self.packet_rate.reset()
+        self.device_rate.reset()
+        if self.dev_rate_level:
+            self.dev_rate_level = 0
+            if not self.led_shared('devs'):
+                self.gpio_blink('devs', 0)
+                self.gpio_off('devs')
+
+    # pull the last second slot of packets_rrd minute_vec out of the raw frame without decoding the whole rrd
+    # set, returns None if the frame doesn't look as expected so the caller can fall back to a full decode
+    rrd_serial_time = re.compile(r'"kismet\.common\.rrd\.serial_time"\s*:\s*(\d+)')
+    rrd_minute_vec = re.compile(r'"kismet\.common\.rrd\.minute_vec"\s*:\s*\[([^\]]*)\]')
+
+    def packets_last_second(self, frame):
+        start = frame.find('{', frame.find('"kismet.packetchain.packets_rrd"'))
+        end = frame.find('}', start)
+        if start == -1 or end == -1:
+            return None
+        serial_time = self.rrd_serial_time.search(frame, start, end)
+        minute_vec = self.rrd_minute_vec.search(frame, start, end)
+        if serial_time is None or minute_vec is None:
+            return None
+        try:
+            return float(minute_vec.group(1).split(',')[int(serial_time.group(1)) % 60 - 1])
+        except (ValueError, IndexError):
+            return None
+
+    def parse_packetchain_stat(self, stats):
+        try:
+            prrd = stats['kismet.packetchain.packets_rrd']
+            offset = prrd['kismet.common.rrd.serial_time'] % 60
+            if prrd['kismet.common.rrd.minute_vec'][offset-1] > 0:
+                return True
+            else:
+                return False
+        except:
+            return False
 
 class KismetStatusLeds(object):
+    # led name, configuration variable holding the line offset, description
+    gpio_led_config = [('ws', 'gpio_led_ws_connected', 'websocket connection status'),
+                       ('gps', 'gpio_led_gps_fix', 'gps fix status'),
+                       ('devs', 'gpio_led_dev_found', 'device found indication'),
+                       ('alert', 'gpio_led_alert', 'alert indication')]
+
     def __init__(self):
         # initialize config
         self.apikey = None
@@ -82,9 +1764,12 @@ class KismetStatusLeds(object):
         try: self.remote_port = httpd_local_port
         except: self.remote_port = None
         self.httpd_uri_prefix = ''
-        self.endpoint = '/eventbus/events.ws'
-        self.timeout = 30
-        self.reconnect_sec = 5
+        # connection configured from files, cache it once a connection works
+        self.profile_pending = False
+        self.profile_loaded = False
+        self.exit_code = 0
+        self.ws_loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.ws_loop)
 
         # init config status indicator
         self.ws_ready = False
@@ -98,56 +1783,75 @@ class KismetStatusLeds(object):
         self.parser.add_argument("--password", action="store", dest="password", help="Kismet password for websocket eventbus")
         self.parser.add_argument("--apikey", action="store", dest="apikey", help="Kismet API key for websocket eventbus")
         self.parser.add_argument("--skip-test", action="store_true", default=False, dest="skip_test", help="skip test connection and go to main loop")
-        self.parser.add_argument("--no-gpio", action="store_true", default=False, dest="no_gpio", help="don't use gpio code, used for testing")
+        self.parser.add_argument("--no-gpio", action="store_true", default=False, dest="no_gpio", help="don't use gpio, same as --gpio-backend recorder, used for testing")
+        self.parser.add_argument("--config", action="store", dest="config", help="json file of configuration variables overriding the script config")
+        self.parser.add_argument("--status", action="store", dest="status", help="publish the status in a memory mapped file (default from script config)")
+        self.parser.add_argument("--metrics", action="store", dest="metrics", help="serve prometheus style metrics on host:port or unix socket path (default from script config)")
+        self.parser.add_argument("--record", action="store", dest="record", help="append received eventbus frames to a capture log (gzip compressed if named .gz)")
+        self.parser.add_argument("--replay", action="store", dest="replay", help="drive the leds from a capture log instead of kismet, then exit")
+        self.parser.add_argument("--speed", action="store", type=float, default=1, dest="speed", help="replay speed, 0 for as fast as possible (default 1)")
+        self.parser.add_argument("--gpio-backend", action="store", choices=['auto'] + sorted(gpio_backends), dest="gpio_backend", help="gpio backend (default from script config, {})".format(gpio_backend))
         self.results = self.parser.parse_args()
+        if not self.results.config is None:
+            self.load_config(self.results.config)
+        try:
+            self.check_rules()
+        except ValueError as err:
+            print(err)
+            sys.exit(1)
 
-        # event bus subscriptions to send
-        self.subscriptions = ['GPS_LOCATION', 'MESSAGE', 'DATASOURCE_ERROR', 'DATASOURCE_OPENED', 'NEW_DATASOURCE', 'PACKETCHAIN_STATS']
-
-        # set up gpio
-        self.gpio = { 'blinking': {} }
-        if self.results.no_gpio:
-            self.gpio['ignore'] = True
-        else:
-            self.gpio['ignore'] = False
+        # set up gpio, configured leds are requested together and written together by the scheduler
+        # roles holds the default led for each role, servers the extra leds of kismet_servers entries by server name.
+        # leds on the same line offset are the same led.
+        self.leds = LedScheduler(self.gpio_write)
+        # instrumentation, None unless a metrics endpoint is set
+        self.metrics = None
+        if self.results.metrics or metrics_listen:
+            self.metrics = Metrics(self)
+        self.status = None
+        if self.results.status or status_file:
             try:
-                import gpiod
-                self.gpio['chip'] = gpiod.chip(gpio_chip)
-            except ImportError:
-                print("Failed to load gpiod python3 module. installation is available from pip")
+                self.status = StatusPublisher(self, self.results.status or status_file)
+            except OSError as err:
+                print(err)
+                print("kismet_status_leds.py: unable to publish status to {}".format(self.results.status or status_file))
                 sys.exit(1)
-            except Exception as err:
-                traceback.print_tb(err.__traceback__)
+        self.recorder = None
+        self.recorder_flush = None
+        if self.results.record:
+            try:
+                self.recorder = FrameRecorder(self.results.record)
+            except OSError as err:
                 print(err)
-                print("kismet_status_leds.py: Unable to setup gpio chip!")
+                print("kismet_status_leds.py: unable to record to {}".format(self.results.record))
                 sys.exit(1)
-            try: gpio_led_ws_connected
-            except NameError: print("kismet_status_leds.py: no gpio pin set for websocket connection status")
-            else:
-                self.gpio['ws'] = self.gpio['chip'].get_line(gpio_led_ws_connected)
-                config = gpiod.line_request()
-                config.consumer = "kismet_status_leds.py"
-                config.request_type = gpiod.line_request.DIRECTION_OUTPUT
-                self.gpio['ws'].request(config)
-                self.gpio['blinking']['ws'] = 0
-            try: gpio_led_gps_fix
-            except NameError: print("kismet_status_leds.py: no gpio pin set for gps fix status")
-            else:
-                self.gpio['gps'] = self.gpio['chip'].get_line(gpio_led_gps_fix)
-                config = gpiod.line_request()
-                config.consumer = "kismet_status_leds.py"
-                config.request_type = gpiod.line_request.DIRECTION_OUTPUT
-                self.gpio['gps'].request(config)
-                self.gpio['blinking']['gps'] = 0
-            try: gpio_led_dev_found
-            except NameError: print("kismet_status_leds.py: no gpio pin set for device found indication")
-            else:
-                self.gpio['devs'] = self.gpio['chip'].get_line(gpio_led_dev_found)
-                config = gpiod.line_request()
-                config.consumer = "kismet_status_leds.py"
-                config.request_type = gpiod.line_request.DIRECTION_OUTPUT
-                self.gpio['devs'].request(config)
-                self.gpio['blinking']['devs'] = 0
+        self.gpio = self.gpio_map()
+        for led in self.gpio['leds']:
+            self.leds.add_led(led)
+        try:
+            self.gpio['backend'] = self.gpio_request(self.gpio['offsets'])
+        except ImportError:
+            print("Failed to load gpiod python3 module. installation is available from pip")
+            sys.exit(1)
+        except ValueError as err:
+            print(err)
+            sys.exit(1)
+        except Exception as err:
+            traceback.print_tb(err.__traceback__)
+            print(err)
+            print("kismet_status_leds.py: Unable to setup gpio chip!")
+            sys.exit(1)
+        self.leds.offload = self.gpio['backend'].blink_offload and gpio_blink_offload
+
+        # replaying, sessions only handle frames so there is no connection to configure
+        if self.results.replay:
+            self.configure_replay()
+            return
+
+        # servers configured, skip the single connection configuration
+        if kismet_servers:
+            self.configure_servers()
+            return
 
         # start configuring connection with arguments passed
         # case using connect argument (remote session or non-default port), split and require apikey or user/pass
@@ -186,6 +1890,10 @@ class KismetStatusLeds(object):
             print("Local websocket credential configured via arguments")
             print("Defaulting to http port 2501, use --connect if kismet is on different port.")
 
+        # if no arguments try a cached profile from an earlier start, valid while the files below are unchanged
+        if not self.ws_ready and self.load_profile():
+            self.ws_ready = True
+
         # if no arguments try to configure using session.db file and name if defined
         if not self.ws_ready:
             global session_db_name
@@ -215,6 +1923,7 @@ class KismetStatusLeds(object):
                         self.remote_host = 'localhost'
                         self.remote_port = self.get_local_port()
                         self.ws_ready = True
+                        self.profile_pending = True
                         print("kismet_status_leds.py: apikey loaded from {}".format(session_db_file))
 
         # still not set up? try to find user/pass from defined config file
@@ -238,6 +1947,7 @@ class KismetStatusLeds(object):
                         self.remote_host = 'localhost'
                         self.remote_port = self.get_local_port()
                         self.ws_ready = True
+                        self.profile_pending = True
                         print("kismet_status_leds.py: username and password loaded from {}".format(httpd_config_file))
 
         # still not configured, check if kismetexternal is available
@@ -272,6 +1982,234 @@ class KismetStatusLeds(object):
             print("                       For command line config options add --help")
             sys.exit(1)
 
+    # json file whose keys override the configuration variables at the top of this script
+    config_prefixes = ('session_db_', 'httpd_', 'profile_', 'ws_', 'gpio_', 'metrics_', 'status_', 'kismet_servers')
+
+    def load_config(self, config_file):
+        try:
+            config = self.read_config(config_file)
+        except (OSError, ValueError) as err:
+            print(err)
+            print("kismet_status_leds.py: unable to load config file {}".format(config_file))
+            sys.exit(1)
+        self.apply_config(config, config_file)
+
+    def read_config(self, config_file):
+        with open(os.path.expanduser(config_file)) as f:
+            config = json.load(f)
+        if not isinstance(config, dict):
+            raise ValueError("expected a json object of settings")
+        return config
+
+    def apply_config(self, config, config_file):
+        for key, value in config.items():
+            if not key.startswith(self.config_prefixes):
+                print("kismet_status_leds.py: ignoring unknown setting '{}' in {}".format(key, config_file))
+            else:
+                globals()[key] = value
+
+    def check_rules(self):
+        for rule in gpio_led_rules:
+            KismetSession.parse_rule(rule)
+
+    # settings only used when starting up
+    restart_prefixes = ('session_db_', 'httpd_', 'profile_', 'metrics_', 'status_', 'kismet_servers', 'gpio_recorder_size')
+
+    # SIGHUP, read the --config file again and apply it in place: leds, durations, rules and subscriptions change on
+    # the live connections, gpio lines are only requested again if they changed. settings in restart_prefixes keep
+    # their running values.
+    def reload_config(self):
+        if self.results.config is None:
+            print("kismet_status_leds.py: no --config file to reload")
+            return
+        try:
+            config = self.read_config(self.results.config)
+        except (OSError, ValueError) as err:
+            print(err)
+            print("kismet_status_leds.py: unable to load config file {}, keeping the running configuration".format(self.results.config))
+            return
+        running = { name: globals()[name] for name in config_defaults }
+        globals().update(config_defaults)
+        self.apply_config(config, self.results.config)
+        try:
+            self.check_rules()
+        except ValueError as err:
+            print(err)
+            print("kismet_status_leds.py: keeping the running configuration")
+            globals().update(running)
+            return
+        restart = [name for name in config_defaults if name.startswith(self.restart_prefixes) and globals()[name] != running[name]]
+        for name in restart:
+            globals()[name] = running[name]
+        if restart:
+            print("kismet_status_leds.py: restart to apply {}".format(", ".join(sorted(restart))))
+
+        gpio = self.gpio_map(report=False)
+        if (gpio['offsets'], gpio_chip, gpio_backend) != (self.gpio['offsets'], running['gpio_chip'], running['gpio_backend']):
+            self.gpio['backend'].release()
+            try:
+                gpio['backend'] = self.gpio_request(gpio['offsets'])
+            except Exception as err:
+                print(err)
+                print("kismet_status_leds.py: unable to set up the new gpio lines, keeping the running configuration")
+                globals().update(running)
+                self.gpio['backend'] = self.gpio_request(self.gpio['offsets'])
+                self.leds.refresh()
+                return
+        else:
+            gpio['backend'] = self.gpio['backend']
+        for led in self.gpio['leds']:
+            if led not in gpio['leds']:
+                self.leds.remove_led(led)
+        for led in gpio['leds']:
+            if led not in self.leds.leds:
+                self.leds.add_led(led)
+        self.gpio = gpio
+        self.leds.offload = self.gpio['backend'].blink_offload and gpio_blink_offload
+
+        for session in self.sessions:
+            session.clear_leds()
+        for session in self.sessions:
+            session.reconfigure(self.session_leds(session.name))
+        self.leds.refresh()
+        print("kismet_status_leds.py: configuration reloaded from {}".format(self.results.config))
+
+    # leds of each role and the kismet_servers leds, from the gpio configuration. leds on the same line offset are
+    # the same led.
+    def gpio_map(self, report=True):
+        gpio = { 'leds': [], 'offsets': [], 'roles': {}, 'servers': {} }
+        for led, setting, desc in self.gpio_led_config:
+            if globals().get(setting) is None:
+                # leds unused by default (ie alert) aren't worth a mention
+                if report and config_defaults.get(setting) is not None:
+                    print("kismet_status_leds.py: no gpio pin set for {}".format(desc))
+            else:
+                gpio['roles'][led] = self.gpio_add_led(gpio, led, globals()[setting])
+        for phy, offset in gpio_led_dev_phy.items():
+            led = 'phy:' + phy.lower()
+            gpio['roles'][led] = self.gpio_add_led(gpio, led, offset)
+        for source, offset in gpio_led_datasources.items():
+            led = 'source:' + source
+            gpio['roles'][led] = self.gpio_add_led(gpio, led, offset)
+        for rule in gpio_led_rules:
+            if isinstance(rule.get('led'), int):
+                led = 'gpio{}'.format(rule['led'])
+                gpio['roles'][led] = self.gpio_add_led(gpio, led, rule['led'])
+        for server in kismet_servers:
+            name = server.get('name', server.get('connect'))
+            gpio['servers'][name] = {}
+            for role, offset in server.get('leds', {}).items():
+                if role.startswith('phy:'):
+                    role = role.lower()
+                gpio['servers'][name][role] = self.gpio_add_led(gpio, "{}.{}".format(name, role), offset)
+        return gpio
+
+    # register a led on line offset unless one already uses it, returns the led name
+    def gpio_add_led(self, gpio, led, offset):
+        if offset in gpio['offsets']:
+            return gpio['leds'][gpio['offsets'].index(offset)]
+        gpio['leds'].append(led)
+        gpio['offsets'].append(offset)
+        return led
+
+    # leds of a session by role, the default leds with its kismet_servers entry's own
+    def session_leds(self, name):
+        leds = dict(self.gpio['roles'])
+        leds.update(self.gpio['servers'].get(name, {}))
+        return leds
+
+    # backend with the offsets requested, raises ValueError for a configuration without a usable backend
+    def gpio_request(self, offsets):
+        if not offsets:
+            backend = 'none'
+        elif self.results.no_gpio:
+            backend = 'recorder'
+        else:
+            backend = self.results.gpio_backend or gpio_backend
+        if backend == 'none':
+            backend_class = GpioBackend
+        elif backend == 'auto':
+            backend_class = gpio_backend_auto()
+            if backend_class is None:
+                raise ValueError("Failed to load gpiod python3 module and no sysfs gpio found. installation is available from pip")
+        elif backend in gpio_backends:
+            backend_class = gpio_backends[backend]
+        else:
+            raise ValueError("kismet_status_leds.py: unknown gpio backend '{}'".format(backend))
+        gpio = backend_class()
+        gpio.request(gpio_chip, offsets)
+        return gpio
+
+    # what a file configured connection depends on, the files' modification times and the settings naming them
+    def profile_key(self):
+        files = []
+        for setting in ['session_db_file', 'httpd_config_file']:
+            if globals().get(setting):
+                files.append(os.path.expanduser(globals()[setting]))
+        if "KISMET_ETC" in os.environ:
+            files += [os.environ["KISMET_ETC"] + conf_file for conf_file in ['/kismet_httpd.conf', '/kismet_site.conf']]
+        mtimes = {}
+        for conf_file in files:
+            try: mtimes[conf_file] = os.stat(conf_file).st_mtime_ns
+            except OSError: mtimes[conf_file] = None
+        return { 'files': mtimes, 'session_db_name': globals().get('session_db_name'),
+                 'httpd_local_port': globals().get('httpd_local_port') }
+
+    # connection settings kept in the profile, attributes of the same name
+    profile_fields = ['apikey', 'username', 'password', 'remote_host', 'remote_port', 'httpd_uri_prefix']
+
+    # a missing, unreadable or malformed cache is a miss, the files are read as without one
+    def load_profile(self):
+        if not globals().get('profile_cache_file'):
+            return False
+        try:
+            with open(os.path.expanduser(profile_cache_file)) as f:
+                profile = json.load(f)
+        except OSError:
+            return False
+        except ValueError:
+            profile = None
+        try:
+            key = profile['key']
+            settings = { field: profile[field] for field in self.profile_fields }
+        except (KeyError, TypeError):
+            print("kismet_status_leds.py: ignoring malformed connection profile {}".format(profile_cache_file))
+            return False
+        if key != self.profile_key():
+            print("kismet_status_leds.py: cached connection profile out of date")
+            return False
+        for field, value in settings.items():
+            setattr(self, field, value)
+        self.profile_loaded = True
+        print("kismet_status_leds.py: connection profile loaded from {}".format(profile_cache_file))
+        return True
+
+    # written only readable by the user, holds credentials
+    def save_profile(self):
+        self.profile_pending = False
+        if not globals().get('profile_cache_file'):
+            return
+        profile = { field: getattr(self, field) for field in self.profile_fields }
+        profile['key'] = self.profile_key()
+        path = os.path.expanduser(profile_cache_file)
+        try:
+            fd = os.open(path + '.tmp', os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(profile, f)
+            os.replace(path + '.tmp', path)
+        except OSError as err:
+            print(err)
+            print("kismet_status_leds.py: unable to save connection profile to {}".format(profile_cache_file))
+
+    def drop_profile(self):
+        try: os.unlink(os.path.expanduser(profile_cache_file))
+        except (OSError, TypeError): pass
+
+    # a session connected, a file based configuration is good to cache
+    def connection_validated(self, session):
+        if self.profile_pending:
+            self.save_profile()
+
     # found credential from file or kismetexternal see if a non-default port is used
     def get_local_port(self):
         # actually respect prior definition of remote_port
@@ -297,7 +2235,7 @@ class KismetStatusLeds(object):
                     etc_port = int(kis_conf['httpd_port'])
                     print("kismet_status_leds.py: httpd_port {} loaded from {}".format(etc_port, etc_dir + conf_file))
                 if 'httpd_uri_prefix' in kis_conf:
-                    self.config.httpd_uri_prefix = kis_conf['httpd_uri_prefix']
+                    self.httpd_uri_prefix = kis_conf['httpd_uri_prefix']
                     print("kismet_status_leds.py: httpd_uri_prefix '{}' loaded from {}".format(kis_conf['httpd_uri_prefix'], etc_dir + conf_file))
         if etc_port is None:
             print("kismet_status_leds.py: unable to load httpd_port from config files. using 2501")
@@ -327,189 +2265,154 @@ class KismetStatusLeds(object):
         self.kei.kill()
         self.check_config()
 
-    # check the ws config and create an uri for the connection
+    # check the ws config and create the session for the connection
     def check_config(self):
-        self.ws_ready = False
-        uri = None
         if not self.remote_host or not self.remote_port:
             print("kismet_status_leds.py: remote_host or remote_port not found in config")
             sys.exit(1)
-        if self.apikey:
-            self.ws_uri = "ws://{}:{}{}{}?KISMET={}".format(self.remote_host, self.remote_port,
-                                    self.httpd_uri_prefix, self.endpoint, self.apikey)
-        elif self.username and self.password:
-            self.ws_uri = "ws://{}:{}@{}:{}{}{}".format(self.username, self.password,
-                                    self.remote_host, self.remote_port, self.httpd_uri_prefix, self.endpoint)
-        # using asyncio to call test of connnection
-        self.ws_loop = asyncio.get_event_loop()
-        self.ws_loop.run_until_complete(self.ws_test())
-        if not self.ws_ready:
-            print("kismet_status_leds.py: initial websocket connection failed!")
-            sys.exit(1)
+        name = "{}:{}".format(self.remote_host, self.remote_port)
+        self.sessions = [KismetSession(self, name, self.remote_host, self.remote_port, self.apikey, self.username,
+                                       self.password, self.httpd_uri_prefix, self.session_leds(name))]
 
-    # make ws connection to test configuration
-    async def ws_test(self):
-        # argument says not to bother
-        if self.results.skip_test:
-            self.ws_ready = True
-        else:
-            ws_con = None
-            try:
-                ws_con = await asyncio.wait_for(websockets.connect(self.ws_uri), self.timeout)
-            except websockets.exceptions.InvalidStatusCode as err:
-                print(err)
-                print("kismet_status_leds.py: websocket connection returned bad status, check credentials!")
-            except ConnectionRefusedError as err:
-                print(err)
-                print("kismet_status_leds.py: websocket connection refused, check config!")
-            except socket.gaierror as err:
-                print(err)
-                print("kismet_status_leds.py: name resolution failed, check config!")
-            except Exception as err:
-                traceback.print_tb(err.__traceback__)
-                print(err)
-            if ws_con is None:
-                self.ws_ready = False
-            else:
-                try:
-                    await asyncio.wait_for(ws_con.send('{"SUBSCRIBE": "TIMESTAMP"}'), self.timeout)
-                    data = await asyncio.wait_for(ws_con.recv(), self.timeout)
-                    ts = json.loads(data)
-                    ts['TIMESTAMP']['kismet.system.timestamp.usec']
-                    await asyncio.wait_for(ws_con.send('{"UNSUBSCRIBE": "TIMESTAMP"}'), self.timeout)
-                    self.ws_ready = True
-                    await ws_con.close()
-                except Exception as err:
-                    traceback.print_tb(err.__traceback__)
-                    print(err)
-                    self.ws_ready = False
+    # sessions for kismet_servers entries, same requirements as the --connect argument
+    def configure_servers(self):
+        self.sessions = []
+        for server in kismet_servers:
+            name = server.get('name', server.get('connect'))
+            host, sep, port = str(server.get('connect', '')).rpartition(":")
+            if not sep or not host:
+                print("Error: Expected connect host:port for kismet server {}.".format(name))
+                sys.exit(1)
+            if (server.get('user') is None or server.get('password') is None) and server.get('apikey') is None:
+                print("Error: username and password or API key required for kismet server {}.".format(name))
+                sys.exit(1)
+            self.sessions.append(KismetSession(self, name, host, int(port), server.get('apikey'), server.get('user'),
+                                               server.get('password'), server.get('uri_prefix', ''), self.session_leds(name)))
+        print("kismet_status_leds.py: {} kismet servers configured".format(len(self.sessions)))
 
-    async def ws_listener(self):
-        while True:
-            try:
-                async with websockets.connect(self.ws_uri) as ws_con:
-                    try:
-                        for event in self.subscriptions:
-                            await ws_con.send(json.dumps({'SUBSCRIBE': event}))
-                    except Exception as err:
-                        traceback.print_tb(err.__traceback__)
-                        print(err)
-                        print("Error sending subscibe statments!")
-                        continue
-                    while True:
-                        await self.gpio_on('ws')
-                        self.ws_ready = True
-                        try:
-                            ev_msg = await asyncio.wait_for(ws_con.recv(), self.timeout)
-                            event = json.loads(ev_msg)
-                            if 'GPS_LOCATION' in event:
-                                if self.parse_gps_3d_fix(event['GPS_LOCATION']):
-                                    asyncio.ensure_future(self.gpio_on('gps', gpio_led_gps_3d_fix_duration))
-                                elif self.parse_gps_2d_fix(event['GPS_LOCATION']):
-                                    asyncio.ensure_future(self.gpio_on('gps', gpio_led_gps_2d_fix_duration))
-                                else:
-                                    await self.gpio_off('gps')
-                            if 'MESSAGE' in event:
-                                if self.parse_new_dev(event['MESSAGE']):
-                                    asyncio.ensure_future(self.gpio_on('devs', gpio_led_dev_found_duration))
-                            if 'DATASOURCE_ERROR' in event and gpio_led_ws_err_blink:
-                                self.gpio['blinking']['ws'] = gpio_led_ws_err_blink_duration
-                                asyncio.ensure_future(self.gpio_on('ws', gpio_led_ws_err_blink_duration))
-                            if 'DATASOURCE_OPENED' in event and gpio_led_ws_err_blink:
-                                self.gpio['blinking']['ws'] = 0
-                                await self.gpio_on('ws')
-                            if 'NEW_DATASOURCE' in event and gpio_led_ws_err_blink:
-                                self.gpio['blinking']['ws'] = 0
-                                await self.gpio_on('ws')
-                            if 'PACKETCHAIN_STATS' in event:
-                                if self.parse_packetchain_stat(event['PACKETCHAIN_STATS']) and gpio_led_dev_packet:
-                                    await self.gpio_on('devs', gpio_led_dev_packet_duration)
-                        except (asyncio.TimeoutError, websockets.exceptions.ConnectionClosed):
-                            try:
-                                pong = await ws_con.ping()
-                                await asyncio.wait_for(pong, self.timeout)
-                                continue
-                            except:
-                                break
-                        except Exception as err:
-                            traceback.print_tb(err.__traceback__)
-                            print(err)
-                            print("Error with handling received data!")
-                            continue
-            except Exception as err:
-                if self.ws_ready:
-                    print("kismet_status_leds.py: websocket connection error, is kismet running?")
-                self.ws_ready = False
-                await self.gpio_off('gps')
-                self.gpio['blinking']['ws'] = 0
-                await self.gpio_off('ws')
-                await asyncio.sleep(self.reconnect_sec)
-                continue
+    # test all connections at once alongside the main loop, so leds start right away. any failure is taken as bad
+    # configuration and stops the main loop.
+    async def test_sessions(self):
+        await asyncio.gather(*[session.ws_test() for session in self.sessions])
+        for session in self.sessions:
+            if not session.tested:
+                print("kismet_status_leds.py: initial websocket connection to {} failed!".format(session.name))
+                if self.profile_loaded:
+                    self.drop_profile()
+                self.exit_code = 1
+                self.ws_loop.stop()
+                return
 
-    def parse_gps_2d_fix(self, gps_msg):
-        if 'kismet.common.location.fix' in gps_msg:
-            if gps_msg['kismet.common.location.fix'] == 2:
-                return True
-            else:
-                return False
-        else:
-            return False
+    # called by the scheduler at most once per tick when any led value changed, values holds every led
+    def gpio_write(self, values):
+        self.gpio['backend'].set_values([values[led] for led in self.gpio['leds']])
+        if self.metrics is not None:
+            self.metrics.led_write(values)
+        if self.status is not None:
+            self.status.changed.set()
 
-    def parse_gps_3d_fix(self, gps_msg):
-        if 'kismet.common.location.fix' in gps_msg:
-            if gps_msg['kismet.common.location.fix'] == 3:
-                return True
-            else:
-                return False
-        else:
-            return False
+    # append a received frame to the capture log, flushed FrameRecorder.flush_interval after the first frame since
+    # the last flush so the last frames are on disk when the stream goes quiet. a failing log (ie disk full) stops
+    # recording, not frame handling.
+    def record_frame(self, session, frame):
+        try:
+            self.recorder.write(self.sessions.index(session), frame)
+        except OSError as err:
+            self.stop_recording(err)
+            return
+        if self.recorder_flush is None:
+            self.recorder_flush = asyncio.get_event_loop().call_later(FrameRecorder.flush_interval, self.flush_recorder)
 
-    def parse_new_dev(self, msg):
-        if 'kismet.messagebus.message_string' in msg:
-            if "Detected new " in msg['kismet.messagebus.message_string'] and " device " in msg['kismet.messagebus.message_string']:
-                return True
-            else:
-                return False
-        else:
-            return False
+    def flush_recorder(self):
+        self.recorder_flush = None
+        if self.recorder is None:
+            return
+        try:
+            self.recorder.flush()
+        except OSError as err:
+            self.stop_recording(err)
 
-    def parse_packetchain_stat(self, stats):
+    def stop_recording(self, err):
+        print(err)
+        print("kismet_status_leds.py: unable to write to {}, recording stopped".format(self.results.record))
         try:
-            prrd = stats['kismet.packetchain.packets_rrd']
-            offset = prrd['kismet.common.rrd.serial_time'] % 60
-            if prrd['kismet.common.rrd.minute_vec'][offset-1] > 0:
-                return True
-            else:
-                return False
-        except:
-            return False
+            self.recorder.close()
+        except OSError:
+            pass
+        self.recorder = None
+
+    # sessions as configured (their led mappings) without credentials, for replay
+    def configure_replay(self):
+        self.sessions = []
+        for server in kismet_servers:
+            name = server.get('name', server.get('connect'))
+            self.sessions.append(KismetSession(self, name, 'localhost', 0, 'replay', leds=self.session_leds(name)))
+        if not self.sessions:
+            self.sessions.append(KismetSession(self, 'replay', 'localhost', 0, 'replay', leds=self.session_leds('replay')))
 
-    async def gpio_on(self, led, on_time=-1):
-        if led in self.gpio:
-            self.gpio[led].set_value(1)
-            if on_time > 0:
-                await asyncio.sleep(on_time)
-                self.gpio[led].set_value(0)
-                if self.gpio['blinking'][led] > 0:
-                    await asyncio.sleep(self.gpio['blinking'][led])
-                    if self.gpio['blinking'][led] > 0:
-                        asyncio.ensure_future(self.gpio_on(led, self.gpio['blinking'][led]))
-        elif self.gpio['ignore']:
-            print(f"LED name '{led}' set on for {on_time} seconds!")
-
-    async def gpio_off(self, led):
-        if led in self.gpio:
-            self.gpio[led].set_value(0)
-        elif self.gpio['ignore']:
-            print(f"LED name '{led}' set off!")
+    # feed a capture log to the sessions the frames were received on, at the recorded pace times speed (0 as fast
+    # as possible), then stop
+    async def replay(self, path, speed):
+        loop = asyncio.get_event_loop()
+        for session in self.sessions:
+            session.ws_ready = True
+            session.show_ws()
+        start = None
+        count = 0
+        try:
+            for stamp, index, frame in read_frames(path):
+                if start is None:
+                    start = (loop.time(), stamp)
+                delay = start[0] + (stamp - start[1]) / speed - loop.time() if speed > 0 else 0
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                elif count % 100 == 0:
+                    await asyncio.sleep(0)
+                session = self.sessions[index] if index < len(self.sessions) else self.sessions[0]
+                try:
+                    session.handle_frame(frame)
+                except Exception as err:
+                    traceback.print_tb(err.__traceback__)
+                    print(err)
+                    print("Error with handling replayed data!")
+                count += 1
+        except (OSError, ValueError, EOFError) as err:
+            print(err)
+            print("kismet_status_leds.py: unable to replay {}".format(path))
+            self.exit_code = 1
+        print("kismet_status_leds.py: replayed {} frames".format(count))
+        # let the scheduler write the last changes
+        await asyncio.sleep(0)
+        self.ws_loop.stop()
 
     def main_loop(self):
-        self.ws_loop.create_task(self.ws_listener())
-        self.ws_loop.run_forever()
+        if self.metrics is not None:
+            self.ws_loop.run_until_complete(self.metrics.start(self.results.metrics or metrics_listen))
+        self.ws_loop.create_task(self.leds.run())
+        if self.status is not None:
+            self.ws_loop.create_task(self.status.run())
+        if hasattr(signal, 'SIGHUP'):
+            self.ws_loop.add_signal_handler(signal.SIGHUP, self.reload_config)
+        # kismet stops plugins with SIGTERM, end the loop so the capture log is closed and frames since its last
+        # flush aren't lost
+        self.ws_loop.add_signal_handler(signal.SIGTERM, self.ws_loop.stop)
+        if self.results.replay:
+            self.ws_loop.create_task(self.replay(self.results.replay, self.results.speed))
+        else:
+            if not self.results.skip_test:
+                self.ws_loop.create_task(self.test_sessions())
+            for session in self.sessions:
+                self.ws_loop.create_task(session.ws_listener())
+        try:
+            self.ws_loop.run_forever()
+        finally:
+            if self.recorder is not None:
+                self.recorder.close()
+        return self.exit_code
 
 if __name__ == "__main__":
     ksl = KismetStatusLeds()
     try:
-        ksl.main_loop()
+        sys.exit(ksl.main_loop())
     except KeyboardInterrupt:
         sys.exit(0)
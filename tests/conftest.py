@@ -0,0 +1,40 @@
+import asyncio, os, sys
+import pytest
+
+# tests import the script from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kismet_status_leds import KismetSession, LedScheduler
+
+# the parts of KismetStatusLeds a session uses, leds on a fake clock without the scheduler task
+class FakeApp(object):
+    def __init__(self):
+        self.writes = []
+        self.leds = LedScheduler(lambda values: self.writes.append(dict(values)))
+        self.leds.clock = 0.
+        self.leds.now = lambda: self.leds.clock
+        self.metrics = None
+        self.recorder = None
+        self.status = None
+        self.sessions = []
+        self.gpio = { 'leds': [] }
+
+    def add_session(self, name, leds):
+        for led in leds.values():
+            if led not in self.leds.leds:
+                self.leds.add_led(led)
+                self.gpio['leds'].append(led)
+        session = KismetSession(self, name, 'localhost', 2501, 'key', leds=leds)
+        self.sessions.append(session)
+        return session
+
+    def values(self):
+        self.leds.update(self.leds.clock)
+        return dict(self.leds.values)
+
+@pytest.fixture
+def app():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    yield FakeApp()
+    loop.close()
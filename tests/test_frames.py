@@ -0,0 +1,94 @@
+import argparse, asyncio, time
+import pytest
+import kismet_status_leds
+from kismet_status_leds import FrameRecorder, KismetStatusLeds, read_frames
+
+# monotonic clock under test control
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    return now
+
+def record(path, clock, frames):
+    recorder = FrameRecorder(str(path))
+    for delay, index, frame in frames:
+        clock[0] += delay
+        recorder.write(index, frame)
+    return recorder
+
+@pytest.mark.parametrize('name', ['capture.log', 'capture.log.gz'])
+def test_round_trip(tmp_path, clock, name):
+    record(tmp_path / name, clock, [(0, 0, '{"GPS_LOCATION": {}}'), (.5, 1, b'{"MESSAGE": {}}')]).close()
+    assert list(read_frames(str(tmp_path / name))) == [(100., 0, b'{"GPS_LOCATION": {}}'), (100.5, 1, b'{"MESSAGE": {}}')]
+
+def test_not_a_frame_log(tmp_path):
+    (tmp_path / 'frames.json').write_text('{"MESSAGE": {}}\n')
+    with pytest.raises(ValueError):
+        list(read_frames(str(tmp_path / 'frames.json')))
+
+def test_truncated_log_ends_at_last_whole_record(tmp_path, clock):
+    path = tmp_path / 'capture.log'
+    record(path, clock, [(0, 0, '{"MESSAGE": {}}'), (1, 0, '{"ALERT": {}}')]).close()
+    path.write_bytes(path.read_bytes()[:-3])
+    assert [frame for stamp, index, frame in read_frames(str(path))] == [b'{"MESSAGE": {}}']
+
+def test_compressed_log_not_closed(tmp_path, clock):
+    path = tmp_path / 'capture.log.gz'
+    recorder = record(path, clock, [(0, 0, '{"MESSAGE": {}}'), (1, 0, '{"ALERT": {}}')])
+    # killed after a flush, the gzip stream has no end
+    recorder.file.flush()
+    data = path.read_bytes()
+    recorder.close()
+    path.write_bytes(data)
+    assert [frame for stamp, index, frame in read_frames(str(path))] == [b'{"MESSAGE": {}}', b'{"ALERT": {}}']
+
+def test_appended_runs_continue_times(tmp_path, clock):
+    path = tmp_path / 'capture.log'
+    record(path, clock, [(0, 0, 'a'), (1, 0, 'b')]).close()
+    # a later run in the same boot, an hour on
+    clock[0] += 3600
+    record(path, clock, [(0, 0, 'c'), (2, 0, 'd')]).close()
+    # and one after a reboot, the clock started over
+    clock[0] = 5.
+    record(path, clock, [(0, 0, 'e')]).close()
+    assert [(stamp, frame) for stamp, index, frame in read_frames(str(path))] == \
+           [(100., b'a'), (101., b'b'), (101., b'c'), (103., b'd'), (103., b'e')]
+
+def test_old_log_clock_going_backwards(tmp_path):
+    path = tmp_path / 'capture.log'
+    with open(path, 'wb') as f:
+        f.write(kismet_status_leds.frame_log_magic)
+        for stamp, frame in [(50., b'a'), (51., b'b'), (3., b'c'), (4.5, b'd')]:
+            f.write(kismet_status_leds.frame_log_record.pack(stamp, 0, len(frame)) + frame)
+    assert [stamp for stamp, index, frame in read_frames(str(path))] == [50., 51., 51., 52.5]
+
+# the recording parts of KismetStatusLeds, without argument parsing or gpio setup
+def recording_app(path):
+    app = KismetStatusLeds.__new__(KismetStatusLeds)
+    app.results = argparse.Namespace(record=str(path))
+    app.recorder = FrameRecorder(str(path))
+    app.recorder_flush = None
+    app.sessions = ['kismet']
+    return app
+
+def test_quiet_stream_flushed(tmp_path, monkeypatch):
+    monkeypatch.setattr(FrameRecorder, 'flush_interval', .01)
+    path = tmp_path / 'capture.log.gz'
+    app = recording_app(path)
+    async def run():
+        app.record_frame('kismet', '{"MESSAGE": {}}')
+        await asyncio.sleep(.05)
+    asyncio.run(run())
+    # on disk without a later frame or closing the log
+    assert [frame for stamp, index, frame in read_frames(str(path))] == [b'{"MESSAGE": {}}']
+    app.recorder.close()
+
+def test_failing_log_stops_recording(tmp_path, capsys):
+    app = recording_app(tmp_path / 'capture.log')
+    def write(index, frame):
+        raise OSError(28, 'No space left on device')
+    app.recorder.write = write
+    app.record_frame('kismet', '{"MESSAGE": {}}')
+    assert app.recorder is None
+    assert capsys.readouterr().out.count('recording stopped') == 1
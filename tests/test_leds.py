@@ -0,0 +1,183 @@
+import asyncio
+import pytest
+import kismet_status_leds
+from kismet_status_leds import LedScheduler, LedClassBackend, RecorderBackend
+
+# scheduler on a fake clock, updates are driven by hand instead of the scheduler task
+def scheduler(*leds):
+    writes = []
+    leds_scheduler = LedScheduler(lambda values: writes.append(dict(values)))
+    leds_scheduler.clock = 0.
+    leds_scheduler.now = lambda: leds_scheduler.clock
+    for led in leds:
+        leds_scheduler.add_led(led)
+    return leds_scheduler, writes
+
+def at(leds_scheduler, when):
+    leds_scheduler.clock = when
+    return leds_scheduler.update(when)
+
+def test_steady_and_timed_on():
+    leds, writes = scheduler('ws', 'devs')
+    leds.on('ws')
+    leds.on('devs', .5)
+    assert at(leds, 0) == .5
+    assert writes[-1] == { 'ws': 1, 'devs': 1 }
+    # overlapping timed on extends the deadline
+    leds.clock = .25
+    leds.on('devs', .5)
+    assert at(leds, .5) == .75
+    assert at(leds, .75) is None
+    assert writes[-1] == { 'ws': 1, 'devs': 0 }
+
+def test_write_only_on_change():
+    leds, writes = scheduler('ws')
+    leds.on('ws')
+    at(leds, 0)
+    leds.on('ws')
+    at(leds, 1)
+    assert len(writes) == 1
+
+def test_blink_edges():
+    leds, writes = scheduler('gps')
+    leds.blink('gps', .5, 1.5)
+    assert at(leds, 0) == .5
+    assert writes[-1]['gps'] == 1
+    assert at(leds, .5) == 2
+    assert writes[-1]['gps'] == 0
+    assert at(leds, 2) == 2.5
+    assert writes[-1]['gps'] == 1
+    # steady off ends the blink
+    leds.off('gps')
+    assert at(leds, 2.1) is None
+    assert writes[-1]['gps'] == 0
+
+def test_higher_layer_preempts_and_resumes():
+    leds, writes = scheduler('ws')
+    leds.on('ws')
+    leds.blink('ws', .1, priority=2, blink_time=1)
+    at(leds, 0)
+    at(leds, .1)
+    assert [write['ws'] for write in writes] == [1, 0]
+    # the layer ends with its blink time, the base layer shows again and the layer is dropped
+    assert at(leds, 1) is None
+    assert writes[-1]['ws'] == 1
+    assert leds.leds['ws']['stack'] == [0]
+
+def test_off_above_base_ends_layer():
+    leds, writes = scheduler('ws')
+    leds.on('ws')
+    leds.blink('ws', .5, priority=1)
+    at(leds, .6)
+    assert writes[-1]['ws'] == 0
+    leds.off('ws', priority=1)
+    at(leds, .7)
+    assert writes[-1]['ws'] == 1
+    assert leds.leds['ws']['stack'] == [0]
+
+def test_base_changes_hidden_under_layer():
+    leds, writes = scheduler('ws')
+    leds.on('ws', priority=1)
+    at(leds, 0)
+    leds.off('ws')
+    at(leds, 1)
+    assert writes == [{ 'ws': 1 }]
+    leds.clear('ws')
+    at(leds, 2)
+    assert writes[-1] == { 'ws': 0 }
+
+def test_offload_blink_values():
+    leds, writes = scheduler('gps')
+    leds.offload = True
+    leds.blink('gps', .5, 1.5)
+    assert at(leds, 0) is None
+    assert writes[-1]['gps'] == (.5, 1.5)
+
+def test_recorder_keeps_last_transitions(monkeypatch):
+    monkeypatch.setattr(kismet_status_leds, 'gpio_recorder_size', 2)
+    backend = RecorderBackend()
+    backend.request('chip', [12, 16])
+    for values in ([1, 0], [1, 1], [0, 1]):
+        backend.set_values(values)
+    assert [values for when, values in backend.transitions] == [(1, 1), (0, 1)]
+
+# led class tree as the kernel lays it out, the timer trigger's delay files are created on write
+def leds_tree(root, *names):
+    for name in names:
+        led = root / name
+        led.mkdir()
+        (led / 'max_brightness').write_text('255\n')
+        (led / 'brightness').write_text('255\n')
+        (led / 'trigger').write_text('heartbeat')
+    return root
+
+def attr(root, led, name):
+    return (root / led / name).read_text()
+
+def test_ledclass_steady_and_offloaded_blink(tmp_path, monkeypatch):
+    root = leds_tree(tmp_path, 'ws', 'gps')
+    monkeypatch.setattr(LedClassBackend, 'leds_root', str(root))
+    backend = LedClassBackend()
+    backend.request('chip', ['ws', 'gps'])
+    assert attr(root, 'ws', 'brightness') == '0'
+    backend.set_values([1, (.5, 1.5)])
+    assert attr(root, 'ws', 'brightness') == '255'
+    assert attr(root, 'gps', 'trigger') == 'timer'
+    assert (attr(root, 'gps', 'delay_on'), attr(root, 'gps', 'delay_off')) == ('500', '1500')
+    # unchanged leds aren't written again
+    (root / 'ws' / 'brightness').unlink()
+    backend.set_values([1, (.05, 1.95)])
+    assert not (root / 'ws' / 'brightness').exists()
+    assert (attr(root, 'gps', 'delay_on'), attr(root, 'gps', 'delay_off')) == ('50', '1950')
+    # steady again stops the trigger
+    backend.set_values([1, 0])
+    assert attr(root, 'gps', 'trigger') == 'none'
+    assert attr(root, 'gps', 'brightness') == '0'
+    backend.release()
+    assert attr(root, 'gps', 'brightness') == '0'
+
+def test_ledclass_missing_led(tmp_path, monkeypatch):
+    monkeypatch.setattr(LedClassBackend, 'leds_root', str(leds_tree(tmp_path, 'ws')))
+    with pytest.raises(OSError):
+        LedClassBackend().request('chip', ['ws', 'gps'])
+
+def test_ledclass_driven_by_scheduler(tmp_path, monkeypatch):
+    root = leds_tree(tmp_path, 'gps')
+    monkeypatch.setattr(LedClassBackend, 'leds_root', str(root))
+    backend = LedClassBackend()
+    backend.request('chip', ['gps'])
+    leds = LedScheduler(lambda values: backend.set_values([values['gps']]))
+    leds.clock = 0.
+    leds.now = lambda: leds.clock
+    leds.offload = backend.blink_offload
+    leds.add_led('gps')
+    leds.blink('gps', .5)
+    # the kernel runs the blink, the scheduler has nothing to wake for
+    assert leds.update(0) is None
+    assert attr(root, 'gps', 'trigger') == 'timer'
+    leds.on('gps')
+    leds.update(1)
+    assert attr(root, 'gps', 'trigger') == 'none'
+    assert attr(root, 'gps', 'brightness') == '255'
+
+def test_failed_write_keeps_scheduler_running():
+    async def run():
+        writes = []
+        def output(values):
+            if not writes:
+                writes.append(None)
+                raise OSError(5, 'Input/output error')
+            writes.append(dict(values))
+        leds = LedScheduler(output)
+        leds.add_led('ws')
+        task = asyncio.get_event_loop().create_task(leds.run())
+        leds.on('ws')
+        await asyncio.sleep(.01)
+        leds.off('ws')
+        await asyncio.sleep(.01)
+        leds.on('ws')
+        await asyncio.sleep(.01)
+        assert not task.done()
+        task.cancel()
+        return writes
+    assert asyncio.run(run()) == [None, { 'ws': 0 }, { 'ws': 1 }]
@@ -0,0 +1,39 @@
+import json
+import pytest
+import kismet_status_leds
+from kismet_status_leds import KismetStatusLeds
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setattr(kismet_status_leds, 'profile_cache_file', str(tmp_path / 'profile'))
+    monkeypatch.setattr(kismet_status_leds, 'session_db_file', str(tmp_path / 'session.db'))
+    monkeypatch.setattr(kismet_status_leds, 'httpd_config_file', str(tmp_path / 'kismet_httpd.conf'))
+    monkeypatch.delenv('KISMET_ETC', raising=False)
+    # the profile methods only use the connection attributes, skip argument parsing and gpio setup
+    app = KismetStatusLeds.__new__(KismetStatusLeds)
+    app.apikey = 'key'
+    app.username = None
+    app.password = None
+    app.remote_host = 'localhost'
+    app.remote_port = 2501
+    app.httpd_uri_prefix = ''
+    app.profile_loaded = False
+    return app
+
+def test_profile_round_trip(app):
+    app.save_profile()
+    app.apikey = None
+    assert app.load_profile()
+    assert app.apikey == 'key' and app.remote_port == 2501 and app.profile_loaded
+
+@pytest.mark.parametrize('content', ['[]', '"profile"', '{}', '{"key": {}}', 'not json'])
+def test_malformed_profile_is_a_miss(app, content):
+    with open(kismet_status_leds.profile_cache_file, 'w') as f:
+        f.write(content)
+    assert not app.load_profile()
+    assert not app.profile_loaded
+
+def test_changed_files_invalidate_profile(app, tmp_path):
+    app.save_profile()
+    (tmp_path / 'session.db').write_text('[]')
+    assert not app.load_profile()
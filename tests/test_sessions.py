@@ -0,0 +1,264 @@
+import asyncio, json
+import pytest
+import kismet_status_leds
+from kismet_status_leds import KismetSession
+
+def connect(session):
+    session.ws_ready = True
+    session.show_ws()
+
+def test_shared_ws_led_lit_while_any_connected(app):
+    north = app.add_session('north', { 'ws': 'ws', 'gps': 'gps' })
+    south = app.add_session('south', { 'ws': 'ws', 'gps': 'gps' })
+    connect(north)
+    connect(south)
+    assert app.values()['ws'] == 1
+    north.disconnected()
+    assert app.values()['ws'] == 1
+    south.disconnected()
+    assert app.values()['ws'] == 0
+
+def test_shared_ws_error_blink_kept_for_connected_session(app):
+    north = app.add_session('north', { 'ws': 'ws' })
+    south = app.add_session('south', { 'ws': 'ws' })
+    connect(north)
+    connect(south)
+    south.set_source('uuid-1', 'wlan0', 'error')
+    north.disconnected()
+    assert app.leds.leds['ws']['stack'] == [0, 1]
+    south.set_source('uuid-1', 'wlan0', 'ok')
+    assert app.leds.leds['ws']['stack'] == [0]
+
+def test_shared_gps_led_shows_best_fix(app, monkeypatch):
+    monkeypatch.setattr(kismet_status_leds, 'gpio_led_gps_stale', None)
+    north = app.add_session('north', { 'gps': 'gps' })
+    south = app.add_session('south', { 'gps': 'gps' })
+    connect(north)
+    connect(south)
+    north.gps.update(3)
+    south.gps.update(0)
+    assert app.values()['gps'] == 1
+    north.disconnected()
+    assert app.values()['gps'] == 0
+
+def test_per_server_leds_not_shared(app):
+    north = app.add_session('north', { 'ws': 'north.ws' })
+    south = app.add_session('south', { 'ws': 'south.ws' })
+    connect(north)
+    connect(south)
+    north.disconnected()
+    assert app.values() == { 'north.ws': 0, 'south.ws': 1 }
+
+def test_dev_rate_winds_down_without_packet_stats(app, monkeypatch):
+    monkeypatch.setattr(kismet_status_leds, 'gpio_led_dev_rate_mode', 'blink')
+    monkeypatch.setattr(kismet_status_leds, 'gpio_led_dev_packet', False)
+    session = app.add_session('kismet', { 'devs': 'devs' })
+    assert 'PACKETCHAIN_STATS' not in session.handlers
+    for i in range(30):
+        session.new_device('IEEE802.11')
+    assert session.dev_rate_level == KismetSession.dev_rate_steps
+    assert session.dev_rate_timer is not None
+    # no more events, the periodic check lowers the level as the rate decays
+    app.leds.clock += 5 * kismet_status_leds.gpio_led_dev_rate_window
+    session.dev_rate_timer.cancel()
+    session.check_dev_rate()
+    assert session.dev_rate_level < 4
+    app.leds.clock += 100 * kismet_status_leds.gpio_led_dev_rate_window
+    session.dev_rate_timer.cancel()
+    session.check_dev_rate()
+    assert session.dev_rate_level == 0
+    assert session.dev_rate_timer is None
+    assert app.values()['devs'] == 0
+
+def message_frame(text):
+    return json.dumps({ 'MESSAGE': { 'kismet.messagebus.message_string': text, 'kismet.messagebus.message_flags': 2 } })
+
+def new_device_frame(phy, dev_type):
+    return json.dumps({ 'NEW_DEVICE': { 'kismet.device.base.phyname': phy, 'kismet.device.base.type': dev_type,
+                                        'kismet.device.base.macaddr': '00:BE:EF:00:00:01' } })
+
+@pytest.mark.parametrize('text, kind', [
+    ("Detected new 802.11 Wi-Fi access point 00:BE:EF:00:00:01", ('IEEE802.11', 'Wi-Fi AP')),
+    ("Detected new 802.11 Wi-Fi device 00:BE:EF:00:00:01", ('IEEE802.11', 'Wi-Fi Device')),
+    ("Detected new 802.11 ad-hoc device 00:BE:EF:00:00:01", ('IEEE802.11', 'Wi-Fi Ad-Hoc')),
+    ("Detected new Bluetooth device 00:BE:EF:00:00:01", ('Bluetooth', None)),
+    ("Detected new BTLE device 00:BE:EF:00:00:01", ('BTLE', None)),
+    ("Detected new RTL433 device 00:BE:EF:00:00:01", ('RTL433', None)),
+])
+def test_new_device_messages_classified_by_phy_name(app, text, kind):
+    session = app.add_session('kismet', { 'devs': 'devs' })
+    found = []
+    session.new_device = lambda phy=None, dev_type=None: found.append((phy, dev_type))
+    session.handle_message(message_frame(text))
+    session.handle_message(message_frame("Saved data to logfile, 1000 packets"))
+    assert found == [kind]
+
+@pytest.mark.parametrize('topic', ['MESSAGE', 'NEW_DEVICE'])
+def test_phy_settings_match_both_topics(app, monkeypatch, topic):
+    monkeypatch.setattr(kismet_status_leds, 'gpio_led_dev_found_topic', topic)
+    monkeypatch.setattr(kismet_status_leds, 'gpio_led_dev_phy_exclude', ['IEEE802.11/Wi-Fi AP'])
+    session = app.add_session('kismet', { 'devs': 'devs', 'phy:ieee802.11': 'wifi' })
+    if topic == 'MESSAGE':
+        session.handle_frame(message_frame("Detected new 802.11 Wi-Fi access point 00:BE:EF:00:00:01"))
+    else:
+        session.handle_frame(new_device_frame('IEEE802.11', 'Wi-Fi AP'))
+    assert app.values() == { 'devs': 0, 'wifi': 1 }
+    if topic == 'MESSAGE':
+        session.handle_frame(message_frame("Detected new 802.11 Wi-Fi device 00:BE:EF:00:00:02"))
+    else:
+        session.handle_frame(new_device_frame('IEEE802.11', 'Wi-Fi Device'))
+    assert app.values() == { 'devs': 1, 'wifi': 1 }
+
+def test_gps_stale_setting_removed(app, monkeypatch):
+    session = app.add_session('kismet', { 'gps': 'gps' })
+    connect(session)
+    session.gps.update(3)
+    timer = session.gps.stale_timer
+    assert timer is not None
+    app.leds.clock += kismet_status_leds.gpio_led_gps_stale + 1
+    session.gps.check_stale()
+    assert session.gps.state == 'stale'
+    # a reload unsets it: the pending check does nothing, reconfigure drops the stale state
+    monkeypatch.setattr(kismet_status_leds, 'gpio_led_gps_stale', None)
+    session.gps.check_stale()
+    session.reconfigure({ 'gps': 'gps' })
+    assert session.gps.state is None
+    assert session.gps.stale_timer is None
+    assert app.values()['gps'] == 0
+
+def test_gps_tracker_reset_when_gps_led_removed(app):
+    session = app.add_session('kismet', { 'gps': 'gps', 'ws': 'ws' })
+    connect(session)
+    session.gps.update(3)
+    session.reconfigure({ 'ws': 'ws' })
+    assert 'GPS_LOCATION' not in session.handlers
+    assert session.gps.state is None and session.gps.fix is None and session.gps.stale_timer is None
+
+def test_reconnect_delay_backoff_and_jitter(app, monkeypatch):
+    monkeypatch.setattr(kismet_status_leds, 'ws_reconnect_min', .5)
+    monkeypatch.setattr(kismet_status_leds, 'ws_reconnect_max', 60)
+    session = app.add_session('kismet', {})
+    for attempt in range(8):
+        delay = session.reconnect_delay()
+        full = min(60, .5 * 2 ** attempt)
+        assert full / 2 <= delay <= full
+    # a long outage stays at the cap instead of overflowing the doubling
+    session.reconnects['attempt'] = 5000
+    for attempt in range(10):
+        assert 30 <= session.reconnect_delay() <= 60
+    assert session.reconnects['attempt'] == 5010
+
+@pytest.mark.parametrize('rule', [
+    { 'topic': 'ALERT' },
+    { 'topic': 'ALERT', 'led': 21, 'pattern': 'strobe' },
+    { 'topic': 'ALERT', 'led': 21, 'priority': -1 },
+    { 'topic': 'ALERT', 'led': 21, 'field': 'kismet.alert.header', 'op': 'match', 'value': '(' },
+    { 'topic': 'ALERT', 'led': 21, 'op': 'near' },
+    { 'topic': 'ALERT', 'led': 21, 'pattern': 'blink' },
+])
+def test_parse_rule_rejects_bad_rules(rule):
+    with pytest.raises(ValueError):
+        KismetSession.parse_rule(rule)
+
+def test_compile_rules_drops_rules_for_missing_leds(app, monkeypatch):
+    monkeypatch.setattr(kismet_status_leds, 'gpio_led_rules', [
+        { 'topic': 'DATASOURCE_CHANNEL_LOCKED', 'led': 21 },
+        { 'topic': 'DATASOURCE_CHANNEL_UNLOCKED', 'led': 22 }])
+    session = app.add_session('kismet', { 'ws': 'ws', 'gpio21': 'gpio21' })
+    assert 'DATASOURCE_CHANNEL_LOCKED' in session.rules
+    assert 'DATASOURCE_CHANNEL_UNLOCKED' not in session.rules
+    assert 'DATASOURCE_CHANNEL_UNLOCKED' not in session.subscriptions
+    # no alert led either, so no alert subscription
+    assert 'ALERT' not in session.subscriptions
+
+def alert_frame(header, **fields):
+    alert = { 'kismet.alert.header': header, 'kismet.alert.location': { 'kismet.common.location.fix': 3 } }
+    alert.update(fields)
+    return json.dumps({ 'ALERT': alert })
+
+def test_handle_rules_highest_priority_match_per_led(app, monkeypatch):
+    monkeypatch.setattr(kismet_status_leds, 'gpio_led_rules', [
+        { 'topic': 'ALERT', 'led': 21, 'priority': 1 },
+        { 'topic': 'ALERT', 'led': 21, 'field': 'kismet.alert.header', 'value': 'DEAUTHFLOOD', 'priority': 3,
+          'pattern': 'blink', 'period': .1 },
+        { 'topic': 'ALERT', 'led': 22, 'field': ['kismet.alert.location', 'kismet.common.location.fix'], 'op': 'ge',
+          'value': 2 },
+        { 'topic': 'ALERT', 'led': 23, 'field': ['kismet.alert.missing', 'nested'], 'op': 'exists' }])
+    session = app.add_session('kismet', { 'gpio21': 'gpio21', 'gpio22': 'gpio22', 'gpio23': 'gpio23' })
+    session.handle_frame(alert_frame('DEAUTHFLOOD'))
+    # only the priority 3 blink applied to led 21, not the priority 1 catch all
+    assert app.leds.leds['gpio21']['stack'] == [0, 3]
+    assert app.leds.leds['gpio21']['layers'][3]['blink'] == .1
+    # nested field matched, a missing nested field doesn't
+    assert app.values() == { 'gpio21': 1, 'gpio22': 1, 'gpio23': 0 }
+    session.handle_frame(alert_frame('BCASTDISCON'))
+    assert app.leds.leds['gpio21']['stack'] == [0, 1, 3]
+
+def test_latest_topics_keep_only_newest_frame(app):
+    session = app.add_session('kismet', { 'gps': 'gps', 'devs': 'devs' })
+    first = json.dumps({ 'GPS_LOCATION': { 'kismet.common.location.fix': 2 } })
+    second = json.dumps({ 'GPS_LOCATION': { 'kismet.common.location.fix': 3 } })
+    session.queue_frame(first)
+    session.queue_frame(second)
+    session.queue_frame(json.dumps({ 'PACKETCHAIN_STATS': {} }))
+    assert session.latest['GPS_LOCATION'][0] == second
+    assert set(session.latest) == { 'GPS_LOCATION', 'PACKETCHAIN_STATS' }
+    assert not session.queue
+    assert session.dropped == { 'GPS_LOCATION': 1 }
+
+def test_queue_full_drops_and_counts(app, monkeypatch):
+    monkeypatch.setattr(kismet_status_leds, 'ws_queue_size', 3)
+    session = app.add_session('kismet', { 'devs': 'devs' })
+    for i in range(5):
+        session.queue_frame(message_frame("Detected new BTLE device 00:BE:EF:00:00:0{}".format(i)))
+    assert [topic for topic, frame, received in session.queue] == ['MESSAGE'] * 3
+    assert '00:BE:EF:00:00:02' in session.queue[-1][1]
+    assert session.dropped == { 'MESSAGE': 2 }
+    assert session.frames_ready.is_set()
+
+def test_unhandled_topics_not_queued(app):
+    session = app.add_session('kismet', { 'devs': 'devs' })
+    seen = []
+    session.dispatch = lambda topic, frame, received=None: seen.append(topic)
+    session.queue_frame(json.dumps({ 'TIMESTAMP': {} }))
+    assert seen == ['TIMESTAMP']
+    assert not session.queue and not session.latest and not session.frames_ready.is_set()
+
+def test_frame_handler_drains_latest_first(app):
+    session = app.add_session('kismet', { 'gps': 'gps', 'devs': 'devs' })
+    seen = []
+    session.dispatch = lambda topic, frame, received=None: seen.append(topic)
+    session.queue_frame(message_frame("Saved data to logfile"))
+    session.queue_frame(json.dumps({ 'GPS_LOCATION': {} }))
+    async def run():
+        task = asyncio.get_event_loop().create_task(session.frame_handler())
+        await asyncio.sleep(0)
+        task.cancel()
+    asyncio.get_event_loop().run_until_complete(run())
+    assert seen == ['GPS_LOCATION', 'MESSAGE']
+
+def test_poller_survives_bad_datasource_list(app, monkeypatch):
+    monkeypatch.setattr(kismet_status_leds, 'ws_datasource_poll', .01)
+    session = app.add_session('kismet', { 'ws': 'ws' })
+    session.ws_ready = True
+    lists = [['not a source', { 'kismet.datasource.uuid': 'uuid-1', 'kismet.datasource.name': 'wlan0',
+                                'kismet.datasource.running': 1, 'kismet.datasource.error': 1 }], ValueError('bad json')]
+    def fetch():
+        result = lists.pop(0) if lists else []
+        if isinstance(result, Exception):
+            raise result
+        return result
+    session.fetch_sources = fetch
+    async def run():
+        task = asyncio.get_event_loop().create_task(session.datasource_poller())
+        await asyncio.sleep(.1)
+        done = task.done()
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        return done
+    assert not asyncio.get_event_loop().run_until_complete(run())
+    # the error source was reconciled, then dropped when later lists no longer had it
+    assert not lists and session.sources == {} and session.sources_failing == 0
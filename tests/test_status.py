@@ -0,0 +1,126 @@
+import asyncio, errno, json, os, threading
+import kismet_status_leds
+from kismet_status_leds import StatusPublisher, read_status
+
+def publisher(app, tmp_path):
+    app.status = StatusPublisher(app, str(tmp_path / 'status'))
+    return app.status
+
+def test_round_trip(app, tmp_path):
+    status = publisher(app, tmp_path)
+    session = app.add_session('kismet', { 'ws': 'ws', 'gps': 'gps' })
+    session.ws_ready = True
+    session.show_ws()
+    session.gps.update(3, 9)
+    session.set_source('uuid-1', 'wlan0', 'error')
+    session.dropped['MESSAGE'] = 4
+    app.values()
+    status.publish()
+    read = read_status(status.path)
+    assert read['sessions'] == 1 and read['connected'] == 1
+    assert (read['gps_fix'], read['gps_state'], read['gps_satellites']) == (3, '3d', 9)
+    assert (read['datasources'], read['datasources_failing'], read['frames_dropped']) == (1, 1, 4)
+    assert read['leds'] == { 'ws': 1, 'gps': 1 }
+
+def test_unchanged_status_not_rewritten(app, tmp_path):
+    status = publisher(app, tmp_path)
+    app.add_session('kismet', { 'ws': 'ws' })
+    status.publish()
+    sequence = status.sequence
+    status.publish()
+    assert status.sequence == sequence and sequence % 2 == 0
+
+def test_reader_retries_while_writing(app, tmp_path):
+    status = publisher(app, tmp_path)
+    app.add_session('kismet', { 'ws': 'ws' })
+    status.publish()
+    # a write in progress, finished by the writer a moment later
+    StatusPublisher.header.pack_into(status.map, 0, status.magic, status.version, 1, status.sequence + 1)
+    timer = threading.Timer(.02, StatusPublisher.header.pack_into, (status.map, 0, status.magic, status.version, 1, status.sequence + 2))
+    timer.start()
+    try:
+        read = read_status(status.path)
+    finally:
+        timer.join()
+    assert read is not None and read['leds'] == { 'ws': 0 }
+
+def test_layout_follows_led_changes(app, tmp_path):
+    status = publisher(app, tmp_path)
+    app.add_session('kismet', { 'ws': 'ws', 'gps': 'gps' })
+    status.publish()
+    assert list(read_status(status.path)['leds']) == ['ws', 'gps']
+    app.leds.add_led('devs')
+    app.gpio['leds'].append('devs')
+    status.publish()
+    assert list(read_status(status.path)['leds']) == ['ws', 'gps', 'devs']
+    app.gpio['leds'] = ['gps']
+    status.publish()
+    assert list(read_status(status.path)['leds']) == ['gps']
+    assert (tmp_path / 'status').stat().st_size == StatusPublisher.size(1)
+
+def test_not_a_status_file(tmp_path):
+    (tmp_path / 'status').write_bytes(b'\0' * 64)
+    assert read_status(str(tmp_path / 'status')) is None
+
+def test_status_topics_subscribed_without_leds(app, tmp_path, monkeypatch):
+    monkeypatch.setattr(kismet_status_leds, 'gpio_led_gps_hysteresis', 0)
+    status = publisher(app, tmp_path)
+    session = app.add_session('kismet', { 'ws': 'ws' })
+    session.ws_ready = True
+    assert { 'GPS_LOCATION', 'PACKETCHAIN_STATS', 'MESSAGE', 'DATASOURCE_ERROR' } <= set(session.subscriptions)
+    session.handle_frame(json.dumps({ 'GPS_LOCATION': { 'kismet.common.location.fix': 2 } }))
+    session.handle_frame(json.dumps({ 'MESSAGE': { 'kismet.messagebus.message_string': "Detected new BTLE device 00:BE:EF:00:00:01" } }))
+    session.handle_frame(json.dumps({ 'PACKETCHAIN_STATS': { 'kismet.packetchain.packets_rrd': {
+        'kismet.common.rrd.serial_time': 62, 'kismet.common.rrd.minute_vec': [250] * 60 } } }))
+    status.publish()
+    read = read_status(status.path)
+    assert (read['gps_fix'], read['gps_state']) == (2, '2d')
+    assert read['packets_per_sec'] == 250
+    assert read['devices_per_min'] > 0
+
+def run_publisher(app, status, changes=()):
+    async def run():
+        task = asyncio.get_event_loop().create_task(status.run())
+        await asyncio.sleep(0)
+        for change in changes:
+            change()
+            status.changed.set()
+            await asyncio.sleep(.01)
+        done = task.done()
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        return done
+    return asyncio.get_event_loop().run_until_complete(run())
+
+def test_led_writes_published_off_the_write_path(app, tmp_path):
+    status = publisher(app, tmp_path)
+    session = app.add_session('kismet', { 'ws': 'ws' })
+    session.ws_ready = True
+    def connect():
+        session.show_ws()
+        app.values()
+    # nothing is written before run() gets to it
+    assert not os.path.getsize(status.path)
+    assert not run_publisher(app, status, [connect])
+    assert read_status(status.path)['leds'] == { 'ws': 1 }
+
+def test_out_of_range_fields_clamped(app, tmp_path):
+    status = publisher(app, tmp_path)
+    session = app.add_session('kismet', { 'gps': 'gps' })
+    session.gps.update(-5, 100000)
+    status.publish()
+    read = read_status(status.path)
+    assert (read['gps_fix'], read['gps_satellites']) == (-1, 32767)
+
+def test_failing_status_file_stops_publishing(app, tmp_path, monkeypatch, capsys):
+    status = publisher(app, tmp_path)
+    app.add_session('kismet', { 'ws': 'ws' })
+    def full(fd, length):
+        raise OSError(errno.ENOSPC, os.strerror(errno.ENOSPC))
+    monkeypatch.setattr(os, 'ftruncate', full)
+    assert run_publisher(app, status, [app.values])
+    assert app.status is None
+    assert capsys.readouterr().out.count("status sharing stopped") == 1